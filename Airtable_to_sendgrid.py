@@ -1,8 +1,12 @@
-import requests
+from http_client import get_session
 import os
 import re
 import logging
-from datetime import datetime, timedelta
+from datetime import timedelta
+from sync_state import Watermark
+from airtable_reader import iter_airtable_emails, chunked, AIRTABLE_PAGE_SIZE
+from reconcile import reconcile
+from suppressions import get_group_suppressions, search_group_suppressions
 
 # Set up logging bumping to enable workflows
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -17,6 +21,9 @@ AIRTABLE_BASE_ID = os.getenv('AIRTABLE_BASE_ID')
 AIRTABLE_TABLE_NAME = os.getenv('AIRTABLE_TABLE_NAME')
 AIRTABLE_URL = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{AIRTABLE_TABLE_NAME}"
 
+# Name of this script's high-water mark in the local sync state
+WATERMARK_NAME = "airtable_to_sendgrid"
+
 # Function to normalize email by decapitalizing, removing aliases, etc.
 def normalize_email(email):
     logging.debug(f"Normalizing email: {email}")
@@ -34,59 +41,45 @@ def split_and_normalize_emails(email_string):
     logging.debug(f"Resulting normalized emails: {normalized_emails}")
     return normalized_emails
 
-# Function to get all records with 'Newsletter Consent' set to 'Consent Revoked' and 'Last Modified Newsletter Consent' within the last 2 hours
-def get_revoked_consent_emails():
+# Function to get all records with 'Newsletter Consent' set to 'Consent Revoked' and 'Last Modified Newsletter Consent' after the watermark
+def get_revoked_consent_emails(watermark=None):
     logging.info("Fetching records with 'Consent Revoked' from Airtable...")
     headers = {
         "Authorization": f"Bearer {AIRTABLE_API_KEY}",
         "Content-Type": "application/json"
     }
     
-    # Calculate the timestamp for 2 hours ago
-    two_hours_ago = (datetime.utcnow() - timedelta(hours=2)).isoformat() + 'Z'
-    logging.debug(f"Timestamp for 2 hours ago: {two_hours_ago}")
+    # Start from the last processed 'Last Modified' mark, or a 2-hour lookback when there is none
+    watermark = watermark or Watermark(WATERMARK_NAME, default_lookback=timedelta(hours=2))
+    logging.debug(f"Fetching records modified after: {watermark.since}")
 
     # Update the filter formula to check for both conditions
-    filter_formula = f"AND({{Newsletter Consent}} = 'Consent Revoked', IS_AFTER({{Last Modified Newsletter Consent}}, '{two_hours_ago}'))"
+    filter_formula = f"AND({{Newsletter Consent}} = 'Consent Revoked', IS_AFTER({{Last Modified Newsletter Consent}}, '{watermark.since}'))"
     params = {
         "filterByFormula": filter_formula
     }
     
-    response = requests.get(AIRTABLE_URL, headers=headers, params=params)
-    
-    if response.status_code == 200:
-        records = response.json().get('records', [])
-        logging.debug(f"Fetched records: {records}")
-        emails = []
-        for record in records:
-            if 'Email' in record['fields']:
-                logging.debug(f"Processing record: {record}")
-                emails.extend(split_and_normalize_emails(record['fields']['Email']))
-        logging.info(f"Emails with 'Consent Revoked' and modified within the last 2 hours: {emails}")
-        return emails
-    else:
-        logging.error(f"Failed to fetch records from Airtable: {response.status_code} - {response.text}")
-        raise Exception(f"Failed to fetch records from Airtable: {response.status_code} - {response.text}")
+    # Stream the matching records page by page so callers can start working before the last page arrives
+    count = 0
+    for email in iter_airtable_emails(AIRTABLE_URL, headers, params, normalize=split_and_normalize_emails,
+                                      on_record=lambda record: watermark.observe(record['fields'].get('Last Modified Newsletter Consent'))):
+        count += 1
+        yield email
+    logging.info(f"Emails with 'Consent Revoked' and modified since {watermark.since}: {count}")
 
-# Function to get unsubscribes from SendGrid
-def get_sendgrid_unsubscribes():
-    logging.info("Fetching unsubscribed emails from SendGrid...")
-    url = f"https://api.sendgrid.com/v3/asm/groups/{UNSUBSCRIBE_GROUP_ID}/suppressions"
-    
-    headers = {
-        "Authorization": f"Bearer {SENDGRID_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
-    response = requests.get(url, headers=headers)
-    
-    if response.status_code == 200:
-        unsubscribes = [normalize_email(email) for email in response.json()]
-        logging.info(f"Fetched unsubscribed emails: {unsubscribes}")
+# Function to get unsubscribes from SendGrid.
+# With a list of emails only those emails are looked up, so the payload scales with the change rate instead of the group size.
+def get_sendgrid_unsubscribes(emails=None):
+    if emails is None:
+        logging.info("Fetching unsubscribed emails from SendGrid...")
+        unsubscribes = [normalize_email(email) for email in get_group_suppressions(UNSUBSCRIBE_GROUP_ID, SENDGRID_API_KEY)]
+        logging.info(f"Fetched {len(unsubscribes)} unsubscribed emails")
         return unsubscribes
-    else:
-        logging.error(f"Failed to get unsubscribes from SendGrid: {response.status_code} - {response.text}")
-        raise Exception(f"Failed to get unsubscribes from SendGrid: {response.status_code} - {response.text}")
+
+    logging.info(f"Checking {len(emails)} emails against the SendGrid unsubscribe group...")
+    unsubscribes = search_group_suppressions(UNSUBSCRIBE_GROUP_ID, SENDGRID_API_KEY, emails)
+    logging.info(f"{len(unsubscribes)} of them are unsubscribed")
+    return unsubscribes
 
 # Function to add emails to SendGrid unsubscribe group
 def add_to_sendgrid_unsubscribes(emails):
@@ -102,7 +95,7 @@ def add_to_sendgrid_unsubscribes(emails):
         "recipient_emails": emails
     }
     
-    response = requests.post(url, headers=headers, json=payload)
+    response = get_session().post(url, headers=headers, json=payload)
     
     if response.status_code == 201:
         logging.info(f"Successfully added {len(emails)} emails to the SendGrid unsubscribe group.")
@@ -113,23 +106,27 @@ def add_to_sendgrid_unsubscribes(emails):
 # Main function
 def main():
     try:
-        # Step 1: Get emails with 'Consent Revoked' and modified within the last 2 hours from Airtable
-        revoked_emails = get_revoked_consent_emails()
-        logging.debug(f"Revoked emails: {revoked_emails}")
-        
-        # Step 2: Get unsubscribed emails from SendGrid
-        unsubscribed_emails = get_sendgrid_unsubscribes()
-        logging.debug(f"Unsubscribed emails: {unsubscribed_emails}")
+        # Step 1: Stream emails with 'Consent Revoked' and modified since the last sync from Airtable
+        watermark = Watermark(WATERMARK_NAME, default_lookback=timedelta(hours=2))
+        revoked_emails = get_revoked_consent_emails(watermark)
         
-        # Step 3: Identify emails that need to be added to the SendGrid unsubscribe group
-        emails_to_add = [email for email in revoked_emails if email not in unsubscribed_emails]
-        logging.debug(f"Emails to add: {emails_to_add}")
+        total_added = 0
+        for emails in chunked(revoked_emails, AIRTABLE_PAGE_SIZE):
+            # Step 2: Check only this page's emails against the SendGrid unsubscribe group
+            unsubscribed_emails = get_sendgrid_unsubscribes(emails)
+            
+            # Step 3: Add the emails that are not unsubscribed yet
+            emails_to_add = reconcile(emails, unsubscribed_emails).added
+            logging.debug(f"Emails to add: {emails_to_add}")
+            if emails_to_add:
+                add_to_sendgrid_unsubscribes(emails_to_add)
+                total_added += len(emails_to_add)
         
-        if emails_to_add:
-            logging.info(f"Adding {len(emails_to_add)} emails to the SendGrid unsubscribe group...")
-            add_to_sendgrid_unsubscribes(emails_to_add)
-        else:
+        if not total_added:
             logging.info("No new emails to add to the SendGrid unsubscribe group.")
+        
+        # Everything up to the newest 'Last Modified' seen has been synced; the next run starts there
+        watermark.commit()
     except Exception as e:
         logging.error(f"An error occurred: {str(e)}")
 
@@ -1,8 +1,12 @@
-import requests
 import os
 import re
 import logging
-from datetime import datetime, timedelta
+from datetime import timedelta
+from sync_state import Watermark
+from airtable_reader import iter_airtable_emails, chunked, AIRTABLE_PAGE_SIZE
+from reconcile import reconcile
+from sendgrid_contacts import upsert_contacts, summarize_outcomes, ERRORED, FAILED, PENDING
+from suppressions import get_group_suppressions, search_group_suppressions, remove_group_suppressions
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -17,6 +21,9 @@ AIRTABLE_BASE_ID = os.getenv('AIRTABLE_BASE_ID')
 AIRTABLE_TABLE_NAME = os.getenv('AIRTABLE_TABLE_NAME')
 AIRTABLE_URL = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{AIRTABLE_TABLE_NAME}"
 
+# Name of this script's high-water mark in the local sync state
+WATERMARK_NAME = "airtable_to_sendgrid_ncg"
+
 # Function to normalize email by decapitalizing, removing aliases, etc.
 def normalize_email(email):
     logging.debug(f"Normalizing email: {email}")
@@ -34,131 +41,124 @@ def split_and_normalize_emails(email_string):
     logging.debug(f"Resulting normalized emails: {normalized_emails}")
     return normalized_emails
 
-# Function to get all records with 'Newsletter Consent' set to 'Consent Given' and 'Last Modified Newsletter Consent' within the last 2 hours
-def get_given_consent_emails():
+# Function to get all records with 'Newsletter Consent' set to 'Consent Given' and 'Last Modified Newsletter Consent' after the watermark
+def get_given_consent_emails(watermark=None):
     logging.info("Fetching records with 'Consent Given' from Airtable...")
     headers = {
         "Authorization": f"Bearer {AIRTABLE_API_KEY}",
         "Content-Type": "application/json"
     }
     
-    # Calculate the timestamp for 2 hours ago
-    two_hours_ago = (datetime.utcnow() - timedelta(hours=2)).isoformat() + 'Z'
-    logging.debug(f"Timestamp for 2 hours ago: {two_hours_ago}")
+    # Start from the last processed 'Last Modified' mark, or a 2-hour lookback when there is none
+    watermark = watermark or Watermark(WATERMARK_NAME, default_lookback=timedelta(hours=2))
+    logging.debug(f"Fetching records modified after: {watermark.since}")
 
     # Update the filter formula to check for both conditions
-    filter_formula = f"AND({{Newsletter Consent}} = 'Consent Given', IS_AFTER({{Last Modified Newsletter Consent}}, '{two_hours_ago}'))"
+    filter_formula = f"AND({{Newsletter Consent}} = 'Consent Given', IS_AFTER({{Last Modified Newsletter Consent}}, '{watermark.since}'))"
     params = {
         "filterByFormula": filter_formula
     }
     
-    response = requests.get(AIRTABLE_URL, headers=headers, params=params)
-    
-    if response.status_code == 200:
-        records = response.json().get('records', [])
-        logging.debug(f"Fetched records: {records}")
-        emails = []
-        for record in records:
-            if 'Email' in record['fields']:
-                logging.debug(f"Processing record: {record}")
-                emails.extend(split_and_normalize_emails(record['fields']['Email']))
-        logging.info(f"Emails with 'Consent Given' and modified within the last 2 hours: {emails}")
-        return emails
-    else:
-        logging.error(f"Failed to fetch records from Airtable: {response.status_code} - {response.text}")
-        raise Exception(f"Failed to fetch records from Airtable: {response.status_code} - {response.text}")
+    # Stream the matching records page by page so callers can start working before the last page arrives
+    count = 0
+    for email in iter_airtable_emails(AIRTABLE_URL, headers, params, normalize=split_and_normalize_emails,
+                                      on_record=lambda record: watermark.observe(record['fields'].get('Last Modified Newsletter Consent'))):
+        count += 1
+        yield email
+    logging.info(f"Emails with 'Consent Given' and modified since {watermark.since}: {count}")
 
-# Function to get unsubscribes from SendGrid
-def get_sendgrid_unsubscribes():
-    logging.info("Fetching unsubscribed emails from SendGrid...")
-    url = f"https://api.sendgrid.com/v3/asm/groups/{UNSUBSCRIBE_GROUP_ID}/suppressions"
-    
-    headers = {
-        "Authorization": f"Bearer {SENDGRID_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
-    response = requests.get(url, headers=headers)
-    
-    if response.status_code == 200:
-        unsubscribes = [normalize_email(email) for email in response.json()]
-        logging.info(f"Fetched unsubscribed emails: {unsubscribes}")
+# Function to get unsubscribes from SendGrid.
+# With a list of emails only those emails are looked up, so the payload scales with the change rate instead of the group size.
+def get_sendgrid_unsubscribes(emails=None):
+    if emails is None:
+        logging.info("Fetching unsubscribed emails from SendGrid...")
+        unsubscribes = [normalize_email(email) for email in get_group_suppressions(UNSUBSCRIBE_GROUP_ID, SENDGRID_API_KEY)]
+        logging.info(f"Fetched {len(unsubscribes)} unsubscribed emails")
         return unsubscribes
-    else:
-        logging.error(f"Failed to get unsubscribes from SendGrid: {response.status_code} - {response.text}")
-        raise Exception(f"Failed to get unsubscribes from SendGrid: {response.status_code} - {response.text}")
 
-# Function to remove emails from SendGrid unsubscribe group
+    logging.info(f"Checking {len(emails)} emails against the SendGrid unsubscribe group...")
+    unsubscribes = search_group_suppressions(UNSUBSCRIBE_GROUP_ID, SENDGRID_API_KEY, emails)
+    logging.info(f"{len(unsubscribes)} of them are unsubscribed")
+    return unsubscribes
+
+# Function to remove emails from SendGrid unsubscribe group.
+# Removals run concurrently and failures are retried; the emails that still failed are returned instead of raising.
 def remove_from_sendgrid_unsubscribes(emails):
     logging.info(f"Removing {len(emails)} emails from the SendGrid unsubscribe group...")
     
-    headers = {
-        "Authorization": f"Bearer {SENDGRID_API_KEY}",
-        "Content-Type": "application/json"
-    }
+    results = remove_group_suppressions(UNSUBSCRIBE_GROUP_ID, SENDGRID_API_KEY, emails)
     
-    for email in emails:
-        url = f"https://api.sendgrid.com/v3/asm/groups/{UNSUBSCRIBE_GROUP_ID}/suppressions/{email}"
-        
-        response = requests.delete(url, headers=headers)
-        
-        if response.status_code == 204:
+    failed = []
+    for email, (success, detail) in results.items():
+        if success:
             logging.info(f"Successfully removed {email} from the SendGrid unsubscribe group.")
         else:
-            logging.error(f"Failed to remove {email} from SendGrid unsubscribe group: {response.status_code} - {response.text}")
-            raise Exception(f"Failed to remove {email} from SendGrid unsubscribe group: {response.status_code} - {response.text}")
+            logging.error(f"Failed to remove {email} from SendGrid unsubscribe group: {detail}")
+            failed.append(email)
+    return failed
 
-# Function to add or update contacts in SendGrid
+# Function to add or update contacts in SendGrid.
+# Emails may be a lazy stream: chunks are sent concurrently as they fill up and every import job is polled to completion.
 def upsert_sendgrid_contacts(emails):
-    logging.info(f"Upserting {len(emails)} contacts to SendGrid 'All Contacts' list...")
-    
-    url = "https://api.sendgrid.com/v3/marketing/contacts"
+    logging.info("Upserting contacts to SendGrid 'All Contacts' list...")
     
-    headers = {
-        "Authorization": f"Bearer {SENDGRID_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
-    contacts = [{"email": email} for email in emails]
-    data = {
-        "contacts": contacts
-    }
+    outcomes = upsert_contacts(emails, SENDGRID_API_KEY)
+    summary = summarize_outcomes(outcomes)
+    logging.info(f"SendGrid upsert finished for {len(outcomes)} contacts: {summary}")
     
-    response = requests.put(url, headers=headers, json=data)
+    # SendGrid rejected these contacts for good (e.g. an invalid address); retrying would not help, so they count as processed
+    errored = [email for email, outcome in outcomes.items() if outcome == ERRORED]
+    if errored:
+        logging.warning(f"SendGrid rejected {len(errored)} contacts: {errored}")
     
-    if response.status_code == 202:
-        logging.info(f"Successfully upserted {len(emails)} contacts to SendGrid.")
-    else:
-        logging.error(f"Failed to upsert contacts to SendGrid: {response.status_code} - {response.text}")
-        raise Exception(f"Failed to upsert contacts to SendGrid: {response.status_code} - {response.text}")
+    # Failed or unfinished jobs may succeed next time, so they keep the watermark where it is
+    not_completed = [email for email, outcome in outcomes.items() if outcome in (FAILED, PENDING)]
+    if not_completed:
+        logging.error(f"Failed to upsert {len(not_completed)} contacts to SendGrid: {not_completed}")
+        raise Exception(f"Failed to upsert {len(not_completed)} contacts to SendGrid: {summary}")
+    return outcomes
 
 # Main function
 def main():
     try:
-        # Step 1: Get emails with 'Consent Given' and modified within the last 2 hours from Airtable
-        given_consent_emails = get_given_consent_emails()
-        logging.debug(f"Consent Given emails: {given_consent_emails}")
+        # Step 1: Stream emails with 'Consent Given' and modified since the last sync from Airtable
+        watermark = Watermark(WATERMARK_NAME, default_lookback=timedelta(hours=2))
+        given_consent_emails = get_given_consent_emails(watermark)
         
-        # Step 2: Get unsubscribed emails from SendGrid
-        unsubscribed_emails = get_sendgrid_unsubscribes()
-        logging.debug(f"Unsubscribed emails: {unsubscribed_emails}")
+        removed = []
+        failed_removals = []
         
-        # Step 3: Identify emails that need to be removed from the SendGrid unsubscribe group
-        emails_to_remove = [email for email in given_consent_emails if email in unsubscribed_emails]
-        logging.debug(f"Emails to remove: {emails_to_remove}")
+        def iter_resubscribed_emails():
+            for emails in chunked(given_consent_emails, AIRTABLE_PAGE_SIZE):
+                logging.debug(f"Consent Given emails: {emails}")
+                
+                # Step 2: Check only this page's emails against the SendGrid unsubscribe group
+                unsubscribed_emails = get_sendgrid_unsubscribes(emails)
+                
+                # Step 3: Remove emails in this page from the SendGrid unsubscribe group
+                emails_to_remove = reconcile(emails, unsubscribed_emails).common
+                if emails_to_remove:
+                    logging.info(f"Removing {len(emails_to_remove)} emails from the SendGrid unsubscribe group...")
+                    failed = remove_from_sendgrid_unsubscribes(emails_to_remove)
+                    failed_removals.extend(failed)
+                    removed.extend(email for email in emails_to_remove if email not in failed)
+                
+                yield from emails
         
-        if emails_to_remove:
-            logging.info(f"Removing {len(emails_to_remove)} emails from the SendGrid unsubscribe group...")
-            remove_from_sendgrid_unsubscribes(emails_to_remove)
-        else:
-            logging.info("No emails to remove from the SendGrid unsubscribe group.")
+        # Step 4: Upsert emails to SendGrid "All Contacts" list; chunks go out while later pages are still read
+        outcomes = upsert_sendgrid_contacts(iter_resubscribed_emails())
         
-        # Step 4: Upsert emails to SendGrid "All Contacts" list
-        if given_consent_emails:
-            logging.info(f"Upserting {len(given_consent_emails)} emails to SendGrid 'All Contacts'.")
-            upsert_sendgrid_contacts(given_consent_emails)
-        else:
+        if not removed:
+            logging.info("No emails to remove from the SendGrid unsubscribe group.")
+        if not outcomes:
             logging.info("No emails to upsert to 'All Contacts'.")
+        
+        # Failed removals do not stop the upsert, but keep the watermark so the next run retries them
+        if failed_removals:
+            raise Exception(f"Failed to remove {len(failed_removals)} emails from the SendGrid unsubscribe group: {failed_removals}")
+        
+        # Everything up to the newest 'Last Modified' seen has been synced; the next run starts there
+        watermark.commit()
     except Exception as e:
         logging.error(f"An error occurred: {str(e)}")
 
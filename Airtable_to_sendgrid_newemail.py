@@ -1,8 +1,10 @@
-import requests
 import os
 import re
 import logging
-from datetime import datetime, timedelta
+from datetime import timedelta
+from sync_state import Watermark
+from sendgrid_contacts import upsert_contacts, summarize_outcomes, ERRORED, FAILED, PENDING
+from airtable_reader import iter_airtable_emails
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -16,6 +18,9 @@ AIRTABLE_BASE_ID = os.getenv('AIRTABLE_BASE_ID')
 AIRTABLE_TABLE_NAME = os.getenv('AIRTABLE_TABLE_NAME')
 AIRTABLE_URL = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{AIRTABLE_TABLE_NAME}"
 
+# Name of this script's high-water mark in the local sync state
+WATERMARK_NAME = "airtable_to_sendgrid_newemail"
+
 # Function to normalize email
 def normalize_email(email):
     logging.debug(f"Normalizing email: {email}")
@@ -33,77 +38,68 @@ def split_and_normalize_emails(email_string):
     logging.debug(f"Resulting normalized emails: {normalized_emails}")
     return normalized_emails
 
-# Function to get all records with 'Last Modified Main Email' within the last day and 'Newsletter Consent' not equal to 'Consent Revoked'
-def get_recent_emails():
-    logging.info("Fetching records with 'Last Modified Main Email' in the last day and 'Newsletter Consent' not 'Consent Revoked'...")
+# Function to get all records with 'Last Modified Main Email' after the watermark and 'Newsletter Consent' not equal to 'Consent Revoked'
+def get_recent_emails(watermark=None):
+    logging.info("Fetching records with 'Last Modified Main Email' since the last sync and 'Newsletter Consent' not 'Consent Revoked'...")
     headers = {
         "Authorization": f"Bearer {AIRTABLE_API_KEY}",
         "Content-Type": "application/json"
     }
 
-    # Calculate the timestamp for 1 day ago
-    one_day_ago = (datetime.utcnow() - timedelta(days=1)).isoformat() + 'Z'
-    logging.debug(f"Timestamp for 1 day ago: {one_day_ago}")
+    # Start from the last processed 'Last Modified' mark, or a 1-day lookback when there is none
+    watermark = watermark or Watermark(WATERMARK_NAME, default_lookback=timedelta(days=1))
+    logging.debug(f"Fetching records modified after: {watermark.since}")
 
-    # Filter formula to check 'Last Modified Main Email' within the last day and 'Newsletter Consent' not 'Consent Revoked'
-    filter_formula = f"AND(NOT({{Newsletter Consent}} = 'Consent Revoked'), IS_AFTER({{Last Modified Main Email}}, '{one_day_ago}'))"
+    # Filter formula to check 'Last Modified Main Email' after the watermark and 'Newsletter Consent' not 'Consent Revoked'
+    filter_formula = f"AND(NOT({{Newsletter Consent}} = 'Consent Revoked'), IS_AFTER({{Last Modified Main Email}}, '{watermark.since}'))"
     params = {
         "filterByFormula": filter_formula
     }
 
-    response = requests.get(AIRTABLE_URL, headers=headers, params=params)
-    
-    if response.status_code == 200:
-        records = response.json().get('records', [])
-        logging.debug(f"Fetched records: {records}")
-        emails = []
-        for record in records:
-            if 'Email' in record['fields']:
-                logging.debug(f"Processing record: {record}")
-                emails.extend(split_and_normalize_emails(record['fields']['Email']))
-        logging.info(f"Emails modified within the last day: {emails}")
-        return emails
-    else:
-        logging.error(f"Failed to fetch records from Airtable: {response.status_code} - {response.text}")
-        raise Exception(f"Failed to fetch records from Airtable: {response.status_code} - {response.text}")
+    # Stream the matching records page by page so callers can start working before the last page arrives
+    count = 0
+    for email in iter_airtable_emails(AIRTABLE_URL, headers, params, normalize=split_and_normalize_emails,
+                                      on_record=lambda record: watermark.observe(record['fields'].get('Last Modified Main Email'))):
+        count += 1
+        yield email
+    logging.info(f"Emails modified since {watermark.since}: {count}")
 
-# Function to upsert contacts in SendGrid
+# Function to add or update contacts in SendGrid.
+# Emails may be a lazy stream: chunks are sent concurrently as they fill up and every import job is polled to completion.
 def upsert_sendgrid_contacts(emails):
-    logging.info(f"Upserting {len(emails)} contacts to SendGrid 'All Contacts' list...")
-    
-    url = "https://api.sendgrid.com/v3/marketing/contacts"
-    
-    headers = {
-        "Authorization": f"Bearer {SENDGRID_API_KEY}",
-        "Content-Type": "application/json"
-    }
+    logging.info("Upserting contacts to SendGrid 'All Contacts' list...")
     
-    contacts = [{"email": email} for email in emails]
-    data = {
-        "contacts": contacts
-    }
+    outcomes = upsert_contacts(emails, SENDGRID_API_KEY)
+    summary = summarize_outcomes(outcomes)
+    logging.info(f"SendGrid upsert finished for {len(outcomes)} contacts: {summary}")
     
-    response = requests.put(url, headers=headers, json=data)
+    # SendGrid rejected these contacts for good (e.g. an invalid address); retrying would not help, so they count as processed
+    errored = [email for email, outcome in outcomes.items() if outcome == ERRORED]
+    if errored:
+        logging.warning(f"SendGrid rejected {len(errored)} contacts: {errored}")
     
-    if response.status_code == 202:
-        logging.info(f"Successfully upserted {len(emails)} contacts to SendGrid.")
-    else:
-        logging.error(f"Failed to upsert contacts to SendGrid: {response.status_code} - {response.text}")
-        raise Exception(f"Failed to upsert contacts to SendGrid: {response.status_code} - {response.text}")
+    # Failed or unfinished jobs may succeed next time, so they keep the watermark where it is
+    not_completed = [email for email, outcome in outcomes.items() if outcome in (FAILED, PENDING)]
+    if not_completed:
+        logging.error(f"Failed to upsert {len(not_completed)} contacts to SendGrid: {not_completed}")
+        raise Exception(f"Failed to upsert {len(not_completed)} contacts to SendGrid: {summary}")
+    return outcomes
 
 # Main function
 def main():
     try:
-        # Step 1: Get emails modified within the last day and 'Newsletter Consent' not 'Consent Revoked' from Airtable
-        recent_emails = get_recent_emails()
-        logging.debug(f"Recent emails: {recent_emails}")
+        # Step 1: Stream emails modified since the last sync and 'Newsletter Consent' not 'Consent Revoked' from Airtable
+        watermark = Watermark(WATERMARK_NAME, default_lookback=timedelta(days=1))
+        recent_emails = get_recent_emails(watermark)
         
-        # Step 2: Upsert emails to SendGrid "All Contacts" list
-        if recent_emails:
-            logging.info(f"Upserting {len(recent_emails)} emails to SendGrid 'All Contacts'.")
-            upsert_sendgrid_contacts(recent_emails)
-        else:
+        # Step 2: Upsert emails to SendGrid "All Contacts" list; chunks go out while later pages are still read
+        outcomes = upsert_sendgrid_contacts(recent_emails)
+        
+        if not outcomes:
             logging.info("No emails to upsert to 'All Contacts'.")
+        
+        # Everything up to the newest 'Last Modified' seen has been synced; the next run starts there
+        watermark.commit()
     except Exception as e:
         logging.error(f"An error occurred: {str(e)}")
 
@@ -1,125 +1,319 @@
 import os
-import gspread
-import requests
-import logging
 import json
-import re
-from oauth2client.service_account import ServiceAccountCredentials
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
-from bs4 import BeautifulSoup  # Importing BeautifulSoup for HTML parsing
+import queue
+import logging
+import multiprocessing
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeoutError
+from http_client import get_session
+from http_cache import get_cache
+from negative_cache import get_negative_cache
+from email_extract import extract_email, scan_bio_emails, CHUNK_SIZE
+from google_sheets import get_spreadsheet
+from airtable_reader import chunked
+from sync_state import load_state, save_state
+from work_leases import LeaseTable, SUBMITTED
+from metrics import get_metrics
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configure Google Sheets API
-scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-with open('credentials.json') as creds_file:
-    creds_json = json.load(creds_file)
-creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_json, scope)
-client = gspread.authorize(creds)
-
-# Define the retry session function
-def requests_retry_session(retries=3, backoff_factor=0.3, status_forcelist=(500, 502, 504), session=None):
-    session = session or requests.Session()
-    retry = Retry(
-        total=retries,
-        read=retries,
-        connect=retries,
-        backoff_factor=backoff_factor,
-        status_forcelist=status_forcelist,
-    )
-    adapter = HTTPAdapter(max_retries=retry)
-    session.mount('http://', adapter)
-    session.mount('https://', adapter)
-    return session
-
-# Define the email extraction function
-def extract_email(text):
-    pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-    matches = re.findall(pattern, text)
-    if matches:
-        return matches[0].strip('\"<>[]()')
-    return None
-
-# Define the GitHub API handler class
+# Number of profiles resolved at the same time; their requests are spread over all keys in MY_GITHUB_API_KEYS
+GITHUB_CONCURRENCY = int(os.getenv('GITHUB_CONCURRENCY', '8'))
+# Seconds one profile may take across its API, README and bio fetches before it is given up
+GITHUB_PROFILE_TIMEOUT = float(os.getenv('GITHUB_PROFILE_TIMEOUT', '60'))
+# How profiles are looked up: 'rest' (one /users request each) or 'graphql' (GRAPHQL_BATCH_SIZE users per query)
+GITHUB_LOOKUP_BACKEND = os.getenv('GITHUB_LOOKUP_BACKEND', 'rest')
+GRAPHQL_BATCH_SIZE = 100
+# Rows of Sheet1 read per range request
+SHEET_READ_ROWS = 500
+# Sync state entry holding the last Sheet1 row whose results were flushed
+CHECKPOINT_KEY = 'cloud_scrap_checkpoint'
+# Number of worker processes; above 1 the keys in MY_GITHUB_API_KEYS are split into that many groups, one per process
+CLOUDSCRAP_WORKERS = int(os.getenv('CLOUDSCRAP_WORKERS', '1'))
+# Lease table shared by the worker processes
+CLOUDSCRAP_LEASE_PATH = os.getenv('CLOUDSCRAP_LEASE_PATH', '.cloudscrap_leases.sqlite')
+# Seconds a worker may hold a row range before another worker may take it over
+LEASE_TTL = 15 * 60
+LEASE_POLL_INTERVAL = 0.5
+# Upper bound (seconds) for a single GitHub request
+GITHUB_REQUEST_TIMEOUT = 15
+# On-disk cache of GitHub user and README responses, revalidated with ETags so repeat scrapes cost almost no quota
+GITHUB_CACHE_PATH = os.getenv('GITHUB_CACHE_PATH', '.github_cache.sqlite')
+GITHUB_CACHE_MAX_BYTES = int(os.getenv('GITHUB_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+
+# Users whose API profile, README and bio held no email, keyed by GitHub user ID; their fallbacks are skipped until the TTL passes
+GITHUB_NEGATIVE_CACHE_PATH = os.getenv('GITHUB_NEGATIVE_CACHE_PATH', '.github_negative_cache.sqlite')
+GITHUB_NEGATIVE_CACHE_TTL = float(os.getenv('GITHUB_NEGATIVE_CACHE_TTL_DAYS', '30')) * 24 * 60 * 60
+
+# Function to get the GitHub response cache
+def get_github_cache():
+    return get_cache(GITHUB_CACHE_PATH, GITHUB_CACHE_MAX_BYTES, name='github_http')
+
+# Function to get the cache of GitHub users known to have no discoverable email
+def get_github_negative_cache():
+    return get_negative_cache(GITHUB_NEGATIVE_CACHE_PATH, GITHUB_NEGATIVE_CACHE_TTL, name='github_no_email')
+
+# Function to get the deadline for the results of a batch of lookups: every profile gets profile_timeout once a worker
+# thread picks it up, plus one request timeout of slack for the call in flight when its deadline passes
+def get_batch_deadline(count, max_workers, profile_timeout):
+    rounds = -(-count // max_workers) if count else 0
+    return time.monotonic() + rounds * profile_timeout + GITHUB_REQUEST_TIMEOUT
+
+# Function to wait for a lookup's result, raising TimeoutError once the batch deadline has passed
+def wait_for_result(future, deadline):
+    try:
+        return future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except FutureTimeoutError:
+        if future.done():
+            raise
+        raise TimeoutError("batch deadline exceeded before the lookup finished") from None
+
+# Function to get the timeout for the next request of a profile, raising once its deadline has passed
+def get_request_timeout(deadline):
+    if deadline is None:
+        return GITHUB_REQUEST_TIMEOUT
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("profile timeout exceeded")
+    return min(GITHUB_REQUEST_TIMEOUT, remaining)
+
+# Define the GitHub API handler class.
+# The quota of every key is tracked from the X-RateLimit-* headers GitHub returns on each API response,
+# so no extra /rate_limit calls are needed: requests go out on the key with the most quota left,
+# and the handler only sleeps when every key is exhausted.
+# REST calls spend the 'core' budget and GraphQL queries the separate 'graphql' point budget, so both are tracked apart.
 class GitHubApiHandler:
     def __init__(self, api_keys):
         self.api_keys = api_keys
         self.current_key_index = 0
-        self.request_count = 0
-        self.max_requests_per_key = 3650
-
-    def get_headers(self):
-        return {'Authorization': f'token {self.api_keys[self.current_key_index]}'}
-
-    def check_and_switch_key(self):
-        remaining_requests = self.get_remaining_requests()
-        logger.info(f"Remaining requests for current key: {remaining_requests}")
-        if remaining_requests < 10:
-            self.current_key_index = (self.current_key_index + 1) % len(self.api_keys)
-            self.request_count = 0
-            logger.info(f"Switched to new API key: {self.current_key_index + 1}")
-
-    def get_remaining_requests(self):
-        headers = self.get_headers()
-        url = 'https://api.github.com/rate_limit'
-        response = requests_retry_session().get(url, headers=headers)
-        if response.status_code == 200:
-            rate_limit_data = response.json()
-            remaining = rate_limit_data['rate']['remaining']
-            return remaining
-        return 0
-
-    def get_user_info_from_github_api(self, profile_url):
-        self.check_and_switch_key()
-        headers = self.get_headers()
+        # Remaining requests and reset time (epoch seconds) per rate-limit resource and key; None until the key's first response
+        self.remaining = {resource: [None] * len(api_keys) for resource in ('core', 'graphql')}
+        self.reset_at = {resource: [0.0] * len(api_keys) for resource in ('core', 'graphql')}
+        self.lock = threading.Lock()
+
+    def get_headers(self, key_index=None):
+        key_index = self.current_key_index if key_index is None else key_index
+        return {'Authorization': f'token {self.api_keys[key_index]}'}
+
+    # Function to pick the key with the most quota left and reserve one request on it.
+    # Keys not seen yet, or past their reset time, count as full. Sleeps until the earliest reset when all keys are used up,
+    # unless that would run past the deadline, in which case TimeoutError is raised right away.
+    def acquire_key(self, resource='core', deadline=None):
+        remaining_by_key = self.remaining[resource]
+        reset_by_key = self.reset_at[resource]
+        while True:
+            with self.lock:
+                now = time.time()
+                best_index, best_remaining = None, 0
+                for index in range(len(self.api_keys)):
+                    remaining = remaining_by_key[index]
+                    if remaining is None or now >= reset_by_key[index]:
+                        remaining = float('inf')
+                    if remaining > best_remaining:
+                        best_index, best_remaining = index, remaining
+                if best_index is not None:
+                    if best_index != self.current_key_index:
+                        logger.debug(f"Switched to API key {best_index + 1}")
+                    self.current_key_index = best_index
+                    if remaining_by_key[best_index] is not None and now < reset_by_key[best_index]:
+                        remaining_by_key[best_index] -= 1
+                    return best_index
+                wait = max(1.0, min(reset_by_key) - now + 1)
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise TimeoutError(f"profile timeout exceeded waiting {wait:.0f}s for a GitHub API key to reset")
+            logger.info(f"All GitHub API keys are exhausted for {resource}, sleeping {wait:.0f}s until the first one resets")
+            time.sleep(wait)
+
+    # Function to update a key's quota from the rate-limit headers of a response.
+    # GitHub names the budget a response counted against in X-RateLimit-Resource; 'resource' is used when it does not.
+    def update_rate_limit(self, key_index, response, resource='core'):
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        reset = response.headers.get('X-RateLimit-Reset')
+        resource = response.headers.get('X-RateLimit-Resource', resource)
+        if remaining is None or reset is None or resource not in self.remaining:
+            return
+        try:
+            remaining, reset = int(remaining), float(reset)
+        except ValueError:
+            return
+        with self.lock:
+            # The server's count is authoritative (conditional 304s do not use quota); ignore headers from an older window
+            if reset >= self.reset_at[resource][key_index]:
+                self.remaining[resource][key_index] = remaining
+                self.reset_at[resource][key_index] = reset
+
+    # Function to send a GitHub API request on the best key, moving to another key if this one turns out to be exhausted.
+    # With a json body the request is a GraphQL POST and draws on the GraphQL budget.
+    def api_get(self, url, deadline=None, json=None):
+        resource = 'core' if json is None else 'graphql'
+        for _ in range(len(self.api_keys) + 1):
+            key_index = self.acquire_key(resource, deadline)
+            if json is None:
+                response = get_github_cache().get(url, headers=self.get_headers(key_index), timeout=get_request_timeout(deadline))
+            else:
+                response = get_session().post(url, headers=self.get_headers(key_index), json=json, timeout=get_request_timeout(deadline))
+            self.update_rate_limit(key_index, response, resource)
+            if response.status_code in (403, 429) and response.headers.get('X-RateLimit-Remaining') == '0':
+                logger.info(f"API key {key_index + 1} is rate limited, retrying {url} on another key")
+                continue
+            return response, key_index
+        return response, key_index
+
+    # Function to resolve a profile's email; with a timeout, the profile is given up once that many seconds have passed
+    def get_user_info_from_github_api(self, profile_url, timeout=None):
+        deadline = time.monotonic() + timeout if timeout else None
         username = profile_url.split('/')[-1]
         url = f'https://api.github.com/users/{username}'
-        response = requests_retry_session().get(url, headers=headers)
+        response, key_index = self.api_get(url, deadline)
         if response.status_code != 200:
             logger.info(f"Failed to fetch user info for {profile_url}, status code: {response.status_code}")
             return None
         user_data = response.json()
-        email = user_data.get('email', '') or self.get_email_from_readme(username, headers)
-        if not email:
-            email = self.get_email_from_bio(profile_url, headers)
+        email = user_data.get('email', '')
+        if email:
+            return email
+        return self.get_email_from_fallbacks(username, profile_url, user_data.get('id'), self.get_headers(key_index), deadline)
+
+    # Function to look for an email in the profile README and, unless the bio was already checked, the bio.
+    # Users for whom this found nothing recently are skipped through the negative cache. A user is only added to it
+    # when every fallback gave a definite answer, so a rate limit or server error is retried on the next run.
+    def get_email_from_fallbacks(self, username, profile_url, user_id, headers, deadline=None, scrape_bio=True):
+        negative_cache = get_github_negative_cache()
+        if user_id is not None and negative_cache.contains(user_id):
+            return None
+
+        email, definite = self.get_email_from_readme(username, headers, deadline)
+        if not email and scrape_bio:
+            email, bio_definite = self.get_email_from_bio(profile_url, headers, deadline)
+            definite = definite and bio_definite
+        if user_id is not None:
+            if email:
+                negative_cache.discard(user_id)
+            elif definite:
+                negative_cache.add(user_id)
         return email
 
-    def get_email_from_readme(self, username, headers):
+    # Function to start the lookups of a batch of profiles; returns one future per profile URL, in the same order
+    def submit_lookups(self, profile_urls, executor, timeout=None):
+        return [executor.submit(self.get_user_info_from_github_api, profile_url, timeout) for profile_url in profile_urls]
+
+    # Function to find the email in a profile README; returns (email, definite), where definite is False when
+    # GitHub could not say whether the README exists (rate limit, server error)
+    def get_email_from_readme(self, username, headers, deadline=None):
         url = f'https://raw.githubusercontent.com/{username}/{username}/main/README.md'
-        response = requests.get(url, headers=headers)
+        response = get_github_cache().get(url, headers=headers, timeout=get_request_timeout(deadline))
         if response.status_code == 200:
-            return extract_email(response.text)
-        return None
+            return extract_email(response.text), True
+        return None, response.status_code == 404
 
-    def get_email_from_bio(self, profile_url, headers):
-        response = requests.get(profile_url, headers=headers)
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Find the div containing the bio
-            bio_div = soup.find('div', class_='p-note user-profile-bio')
-            
-            if bio_div:
-                # First, try to extract the email from the visible text in the div
-                bio_text = bio_div.get_text()
-                email = extract_email(bio_text)
-                
-                if not email:
-                    bio_data_text = bio_div.get('data-bio-text', '')
-                    email = extract_email(bio_data_text)
-                
-                return email
-        return None
+    # Function to find the email in a profile's bio; returns (email, definite) like get_email_from_readme.
+    # The page is streamed and only scanned up to the end of the bio block.
+    def get_email_from_bio(self, profile_url, headers, deadline=None):
+        with get_session().get(profile_url, headers=headers, timeout=get_request_timeout(deadline), stream=True) as response:
+            if response.status_code == 200:
+                candidates = scan_bio_emails(response.iter_content(chunk_size=CHUNK_SIZE))
+                return (candidates[0] if candidates else None), True
+        return None, False
+
+# GitHub handler that resolves up to GRAPHQL_BATCH_SIZE users per GraphQL query (email, bio and website in one go).
+# Only users still without an email go through the README fallback; the bio is not scraped again since the query returned it.
+class GitHubGraphQLHandler(GitHubApiHandler):
+    GRAPHQL_URL = 'https://api.github.com/graphql'
+    USER_FIELDS = 'login databaseId email websiteUrl bio'
+
+    # Function to fetch many users in one query; returns login -> user dict (None for unknown logins)
+    def fetch_users(self, usernames, deadline=None):
+        aliases = {f"u{index}": username for index, username in enumerate(usernames)}
+        query = "query {\n" + "\n".join(
+            f"  {alias}: user(login: {json.dumps(username)}) {{ {self.USER_FIELDS} }}" for alias, username in aliases.items()
+        ) + "\n}"
+        response, _ = self.api_get(self.GRAPHQL_URL, deadline, json={'query': query})
+        if response.status_code != 200:
+            raise Exception(f"GitHub GraphQL query failed: {response.status_code} - {response.text}")
+        payload = response.json()
+        data = payload.get('data')
+        errors = payload.get('errors') or []
+        # Only NOT_FOUND errors are per-user; anything else means the results can't be trusted
+        failures = [error for error in errors if error.get('type') != 'NOT_FOUND']
+        if data is None or failures:
+            messages = '; '.join(error.get('message', '') for error in failures or errors)
+            raise Exception(f"GitHub GraphQL query failed: {messages or 'no data returned'}")
+        not_found = {error['path'][0] for error in errors if error.get('path')}
+        users = {}
+        for alias, username in aliases.items():
+            if data.get(alias) is None and alias not in not_found:
+                raise Exception(f"GitHub GraphQL query returned no result for {username}")
+            users[username] = data.get(alias)
+        return users
+
+    # Function to pick an email from a GraphQL user: the public email, then the bio, then the website
+    def get_email_from_user(self, user):
+        if user.get('email'):
+            return user['email']
+        return extract_email(user.get('bio') or '') or extract_email(user.get('websiteUrl') or '')
+
+    def submit_lookups(self, profile_urls, executor, timeout=None):
+        futures = []
+        for urls in chunked(profile_urls, GRAPHQL_BATCH_SIZE):
+            usernames = [profile_url.split('/')[-1] for profile_url in urls]
+            try:
+                users = self.fetch_users(usernames, time.monotonic() + timeout if timeout else None)
+            except Exception as e:
+                # Fall back to one REST lookup per profile for this chunk
+                logger.error(f"{e}; looking up {len(urls)} profiles one by one")
+                futures += super().submit_lookups(urls, executor, timeout)
+                continue
+
+            for profile_url, username in zip(urls, usernames):
+                user = users.get(username)
+                email = self.get_email_from_user(user) if user else None
+                if email or user is None:
+                    if user is None:
+                        logger.info(f"Failed to fetch user info for {profile_url}: user not found")
+                    future = Future()
+                    future.set_result(email)
+                    futures.append(future)
+                else:
+                    futures.append(executor.submit(self.resolve_unresolved, username, profile_url, user, timeout))
+        return futures
+
+    def resolve_unresolved(self, username, profile_url, user, timeout=None):
+        deadline = time.monotonic() + timeout if timeout else None
+        return self.get_email_from_fallbacks(username, profile_url, user.get('databaseId'), self.get_headers(), deadline,
+                                             scrape_bio=user.get('bio') is None)
+
+# GitHub lookup backends selectable with GITHUB_LOOKUP_BACKEND
+GITHUB_HANDLERS = {
+    'rest': GitHubApiHandler,
+    'graphql': GitHubGraphQLHandler,
+}
 
 # Define Google Sheets interaction functions
-def get_records_with_empty_done(worksheet):
-    records = worksheet.get_all_records()
-    # Filter records where 'Done?' is empty (column 'Done?' is assumed to be at index 4, corresponding to column E)
-    filtered_records = [record for record in records if not record['Done?']]
-    return filtered_records
+# Function to turn a 1-based column number into its letter(s), e.g. 5 -> E
+def column_letter(column):
+    letters = ''
+    while column:
+        column, remainder = divmod(column - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+# Function to stream the records whose 'Done?' is empty as (row number, record) pairs.
+# The sheet is read SHEET_READ_ROWS rows at a time from start_row on, so only one range is held in memory.
+def iter_records_with_empty_done(worksheet, header, start_row=2, chunk_rows=SHEET_READ_ROWS):
+    last_column = column_letter(len(header))
+    row_count = worksheet.row_count
+    for first_row in range(start_row, row_count + 1, chunk_rows):
+        last_row = min(first_row + chunk_rows - 1, row_count)
+        rows = worksheet.get(f"A{first_row}:{last_column}{last_row}")
+        for offset, row in enumerate(rows):
+            if not any(row):
+                continue  # Skip completely empty rows
+            record = dict(zip(header, list(row) + [''] * (len(header) - len(row))))
+            if not record['Done?']:
+                yield first_row + offset, record
 
 def batch_update_sheet1(worksheet, batch_done_updates):
     # Update 'Done?' field for all records in the batch
@@ -131,24 +325,39 @@ def batch_append_to_sheet2(worksheet, batch_email_data):
     logger.info(f"Appending {len(batch_email_data)} records to Sheet2.")
     worksheet.append_rows(batch_email_data)
 
-# Process batches of records from Google Sheets
-def process_batch(worksheet1, worksheet2, github_api_handler):
-    records = get_records_with_empty_done(worksheet1)
+# Process batches of records from Google Sheets.
+# Rows are streamed from the sheet and profiles of a batch are resolved concurrently; results are collected in input order
+# before the batch is flushed. After every flush the last flushed row is checkpointed, so a restarted run resumes right
+# after it. The checkpoint is cleared once the whole sheet has been processed.
+def process_batch(worksheet1, worksheet2, github_api_handler, max_workers=GITHUB_CONCURRENCY, profile_timeout=GITHUB_PROFILE_TIMEOUT,
+                  checkpoint_key=CHECKPOINT_KEY):
     batch_size = 100
     batch_done_updates = []
     batch_email_data = []
     
-    for i in range(0, len(records), batch_size):
-        batch = records[i:i + batch_size]
-        for record in batch:
-            profile_url = record['Profile URL']
-            row_index = records.index(record) + 2  # Adding 2 for 1-based indexing and skipping the header
-            if profile_url:
-                logger.info(f"Processing record: {record['Username']} with GitHub URL: {profile_url}")
+    header = worksheet1.row_values(1)
+    done_column = column_letter(header.index('Done?') + 1)
+    checkpoint = load_state(checkpoint_key)
+    start_row = checkpoint + 1 if checkpoint else 2
+    if checkpoint:
+        logger.info(f"Resuming after row {checkpoint}, the last row flushed by the previous run")
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for batch in chunked(iter_records_with_empty_done(worksheet1, header, start_row), batch_size):
+            profiles = []
+            for row_index, record in batch:
+                profile_url = record['Profile URL']
+                if profile_url:
+                    logger.info(f"Processing record: {record['Username']} with GitHub URL: {profile_url}")
+                    profiles.append((row_index, record, profile_url))
+            futures = github_api_handler.submit_lookups([profile[2] for profile in profiles], executor, profile_timeout)
+            deadline = get_batch_deadline(len(futures), max_workers, profile_timeout)
+            
+            for (row_index, record, profile_url), future in zip(profiles, futures):
                 try:
-                    email = github_api_handler.get_user_info_from_github_api(profile_url)
+                    email = wait_for_result(future, deadline)
                     # Add 'Done?' update to batch
-                    batch_done_updates.append({'range': f'E{row_index}', 'values': [['Yes']]})
+                    batch_done_updates.append({'range': f'{done_column}{row_index}', 'values': [['Yes']]})
                     if email:
                         # Add email data to batch for Sheet2
                         batch_email_data.append([
@@ -161,14 +370,171 @@ def process_batch(worksheet1, worksheet2, github_api_handler):
                 except Exception as e:
                     logger.error(f"An error occurred while processing {profile_url}: {e}")
 
-        # After processing a batch of 100, update Sheet1 and append to Sheet2
-        if batch_done_updates:
-            batch_update_sheet1(worksheet1, batch_done_updates)
-            batch_done_updates.clear()  # Clear the batch after updating
+            # After processing a batch of 100, append to Sheet2 and then mark the rows in Sheet1,
+            # so a crash in between repeats rows instead of losing their emails
+            if batch_email_data:
+                batch_append_to_sheet2(worksheet2, batch_email_data)
+                batch_email_data.clear()  # Clear the batch after appending
+
+            if batch_done_updates:
+                batch_update_sheet1(worksheet1, batch_done_updates)
+                batch_done_updates.clear()  # Clear the batch after updating
+
+            save_state(checkpoint_key, batch[-1][0])
+
+    # Every row has been through a flush; the next run starts from the top again to pick up new and failed rows
+    save_state(checkpoint_key, None)
+
+# Function run in each scraping worker process: lease row ranges, resolve their profiles with this worker's keys
+# and hand the results to the writer through the results queue. Workers never touch the sheets.
+def scrape_worker(worker_id, api_keys, lease_path, results, backend=None, max_workers=GITHUB_CONCURRENCY,
+                  profile_timeout=GITHUB_PROFILE_TIMEOUT):
+    baseline = get_metrics().copy()
+    github_api_handler = GITHUB_HANDLERS[backend or GITHUB_LOOKUP_BACKEND](api_keys)
+    leases = LeaseTable(lease_path)
+    logger.info(f"Worker {worker_id} started with {len(api_keys)} API keys")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            lease = leases.acquire(worker_id, LEASE_TTL)
+            if lease is None:
+                if leases.is_drained():
+                    break
+                time.sleep(LEASE_POLL_INTERVAL)
+                continue
+
+            lease_id, rows = lease
+            profiles = [(row_index, record) for row_index, record in rows if record['Profile URL']]
+            futures = github_api_handler.submit_lookups([record['Profile URL'] for _, record in profiles], executor, profile_timeout)
+            deadline = get_batch_deadline(len(futures), max_workers, profile_timeout)
+            outcomes = []
+            for (row_index, record), future in zip(profiles, futures):
+                try:
+                    outcomes.append((row_index, record, wait_for_result(future, deadline), None))
+                except Exception as e:
+                    outcomes.append((row_index, record, None, str(e)))
+            if leases.submit(lease_id, worker_id):
+                results.put((lease_id, worker_id, outcomes))
+            else:
+                logger.warning(f"Worker {worker_id} lost the lease on rows {rows[0][0]}-{rows[-1][0]}; dropping its results")
+    leases.close()
+    # Worker processes exit without running atexit hooks, so the parent reports this worker's calls and cache lookups
+    results.put((None, worker_id, get_metrics().since(baseline)))
+    logger.info(f"Worker {worker_id} finished")
+
+# Function to fill the lease table with the pending rows of Sheet1, one range per SHEET_READ_ROWS rows
+def enqueue_lease_ranges(worksheet1, header, leases):
+    range_rows = []
+    range_start = None
+    for row_index, record in iter_records_with_empty_done(worksheet1, header):
+        if range_start is None:
+            range_start = row_index
+        range_rows.append((row_index, record))
+        if len(range_rows) >= SHEET_READ_ROWS:
+            leases.add(range_start, row_index, range_rows)
+            range_rows, range_start = [], None
+    if range_rows:
+        leases.add(range_start, range_rows[-1][0], range_rows)
+    leases.seal()
 
+# Function to scrape with one worker process per group of API keys, sharing the work through a lease table.
+# This process is the single writer: it fills the lease table, flushes every range's results to the sheets and
+# only then marks the range done. A restarted run picks up the ranges that were not done.
+def run_sharded(worksheet1, worksheet2, api_keys, workers, lease_path=None):
+    lease_path = lease_path or CLOUDSCRAP_LEASE_PATH
+    workers = max(1, min(workers, len(api_keys)))
+    key_groups = [api_keys[index::workers] for index in range(workers)]
+    header = worksheet1.row_values(1)
+    done_column = column_letter(header.index('Done?') + 1)
+
+    leases = LeaseTable(lease_path)
+    if leases.is_sealed() and not leases.is_complete():
+        logger.info(f"Resuming the previous sharded run: {leases.counts()}")
+        leases.release_unfinished()
+    else:
+        leases.reset()
+
+    # Spawned workers start clean instead of inheriting this process's sessions, caches and locks
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+
+    def start_worker(index):
+        process = context.Process(target=scrape_worker, args=(f"worker-{index + 1}", key_groups[index], lease_path, results),
+                                  daemon=True)
+        process.start()
+        return process
+
+    processes = [start_worker(index) for index in range(workers)]
+    if not leases.is_sealed():
+        # Workers start on the first ranges while the rest of the sheet is still being read
+        enqueue_lease_ranges(worksheet1, header, leases)
+
+    while not leases.is_complete():
+        # Checked before waiting, so a message sent just before the last worker exited is still read first
+        workers_alive = any(process.is_alive() for process in processes)
+        try:
+            lease_id, worker_id, outcomes = results.get(timeout=LEASE_POLL_INTERVAL)
+        except queue.Empty:
+            if not workers_alive:
+                # Every worker stopped (or crashed) with ranges left; hand them out again to a fresh set of workers
+                logger.warning(f"All workers exited with work left: {leases.counts()}; restarting them")
+                leases.release_unfinished()
+                processes = [start_worker(index) for index in range(workers)]
+            continue
+
+        if lease_id is None:
+            get_metrics().merge(outcomes)
+            continue
+
+        # Only flush results for a range still submitted by the worker that sent them; anything else is a stale
+        # duplicate of a range that was already flushed or handed out again
+        if leases.state(lease_id) != (SUBMITTED, worker_id):
+            logger.info(f"Skipping stale results for lease {lease_id} from {worker_id}")
+            continue
+
+        batch_done_updates = []
+        batch_email_data = []
+        for row_index, record, email, error in outcomes:
+            if error is not None:
+                logger.error(f"An error occurred while processing {record['Profile URL']}: {error}")
+                continue
+            batch_done_updates.append({'range': f'{done_column}{row_index}', 'values': [['Yes']]})
+            if email:
+                batch_email_data.append([record['Username'], record['User ID'], record['Profile URL'], email, record['Repo']])
+
+        # Same order as process_batch: a crash in between repeats rows instead of losing their emails
         if batch_email_data:
             batch_append_to_sheet2(worksheet2, batch_email_data)
-            batch_email_data.clear()  # Clear the batch after appending
+        if batch_done_updates:
+            batch_update_sheet1(worksheet1, batch_done_updates)
+        leases.complete(lease_id)
+
+    # Every range is done; wait for the workers' metrics before they are joined
+    stop_at = time.monotonic() + LEASE_POLL_INTERVAL * 4
+    while time.monotonic() < stop_at:
+        workers_alive = any(process.is_alive() for process in processes)
+        try:
+            lease_id, worker_id, outcomes = results.get(timeout=LEASE_POLL_INTERVAL)
+        except queue.Empty:
+            if not workers_alive:
+                break
+            continue
+        if lease_id is None:
+            get_metrics().merge(outcomes)
+    for process in processes:
+        process.join(timeout=LEASE_POLL_INTERVAL)
+    leases.close()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(lease_path + suffix):
+            os.remove(lease_path + suffix)
+
+# Function to log the GitHub cache lookups of the run, including the ones made in worker processes
+def log_cache_stats():
+    caches = get_metrics().copy().caches
+    hits, misses = caches.get('github_http', [0, 0])
+    logger.info(f"GitHub cache: {hits} responses revalidated with 304, {misses} fetched in full")
+    hits, misses = caches.get('github_no_email', [0, 0])
+    logger.info(f"GitHub negative cache: {hits} known misses skipped, "
+                f"hit ratio {hits / (hits + misses) if hits + misses else 0.0:.1%}")
 
 # Main function
 def main():
@@ -176,19 +542,26 @@ def main():
         # Load GitHub API keys
         github_api_keys = os.environ['MY_GITHUB_API_KEYS'].split(',')
 
-        # Initialize GitHub API handler
-        github_api_handler = GitHubApiHandler(github_api_keys)
+        # Initialize GitHub API handler for the configured backend
+        github_api_handler = GITHUB_HANDLERS[GITHUB_LOOKUP_BACKEND](github_api_keys)
 
         # Open the Google Sheet
-        sheet = client.open_by_url("https://docs.google.com/spreadsheets/d/1rKdG00VihG3zHRQLgQ6NteUHhdQxAqP2reLU8LCFotk/edit#gid=0")
+        sheet = get_spreadsheet("https://docs.google.com/spreadsheets/d/1rKdG00VihG3zHRQLgQ6NteUHhdQxAqP2reLU8LCFotk/edit#gid=0")
         
         # Select the worksheets (Sheet1 and Sheet2)
         worksheet1 = sheet.worksheet("Sheet1")
         worksheet2 = sheet.worksheet("Sheet2")
         
-        # Process records in batches of 100
-        logger.info("Processing records in batches...")
-        process_batch(worksheet1, worksheet2, github_api_handler)
+        if CLOUDSCRAP_WORKERS > 1:
+            # One process per key group; this process only reads and writes the sheets
+            logger.info(f"Processing records with {CLOUDSCRAP_WORKERS} worker processes...")
+            run_sharded(worksheet1, worksheet2, github_api_keys, CLOUDSCRAP_WORKERS)
+        else:
+            # Process records in batches of 100
+            logger.info("Processing records in batches...")
+            process_batch(worksheet1, worksheet2, github_api_handler)
+
+        log_cache_stats()
 
     except Exception as e:
         logger.error(f"An error occurred in the main function: {e}")
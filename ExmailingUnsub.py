@@ -1,18 +1,14 @@
-import requests
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+from http_client import get_session
+from airtable_reader import iter_airtable_records, iter_airtable_pages, chunked
+from airtable_writer import AirtableWriteBuffer
+from google_sheets import LazyWorksheet
+from sync_state import load_state, save_state
 from datetime import datetime
 import os
-import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-# Set up Google Sheets
-scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-# Read Google credentials from the credentials.json file (as you specified)
-with open('credentials.json') as creds_file:
-    creds_json = json.load(creds_file)
-creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_json, scope)
-client = gspread.authorize(creds)
-sheet = client.open_by_url("https://docs.google.com/spreadsheets/d/18ORZTfeVGVCo7Wx4wzQMhMVPseCnGRT3W1wKEGNhSaw/edit#gid=0").worksheet("Exmailing")
+# Set up Google Sheets (credentials.json is read and the sheet opened on first use)
+sheet = LazyWorksheet("https://docs.google.com/spreadsheets/d/18ORZTfeVGVCo7Wx4wzQMhMVPseCnGRT3W1wKEGNhSaw/edit#gid=0", "Exmailing")
 
 # Set up Airtable API
 AIRTABLE_API_KEY = os.getenv('AIRTABLE_API_KEY')
@@ -23,56 +19,192 @@ AIRTABLE_BASE_IDS_AND_TABLES = [
     (os.getenv('AIRTABLE_BASE_ID_4'), os.getenv('AIRTABLE_TABLE_ID_4'))
 ]
 
-# Function to search for a record by Record ID in multiple Airtable tables
-def search_airtable_record(record_id):
+# Buffered writer that sends record updates and inserts in 10-record batches
+airtable_writer = AirtableWriteBuffer(AIRTABLE_API_KEY)
+
+# Number of record IDs combined into one OR(RECORD_ID()=...) formula, keeping the URL well under Airtable's limit
+RECORD_ID_BATCH_SIZE = 50
+# Number of concurrent Airtable lookups across all bases; each base is still rate limited separately
+LOOKUP_WORKERS = 8
+# Pages per base assumed before an email index build has measured the bases
+DEFAULT_INDEX_PAGES_PER_BASE = 100
+# Sync state entry holding the number of pages the last email index build read
+INDEX_PAGES_STATE_KEY = 'exmailing_email_index_pages'
+
+# Function to fetch every record of one base/table matching a formula
+def query_airtable_base(base_id, table_name, filter_formula):
     headers = {
         "Authorization": f"Bearer {AIRTABLE_API_KEY}",
         "Content-Type": "application/json"
     }
+    url = f"https://api.airtable.com/v0/{base_id}/{table_name}"
+    return list(iter_airtable_records(url, headers, {"filterByFormula": filter_formula}))
 
-    for base_id, table_name in AIRTABLE_BASE_IDS_AND_TABLES:
-        url = f"https://api.airtable.com/v0/{base_id}/{table_name}?filterByFormula=RECORD_ID()='{record_id}'"
-        response = requests.get(url, headers=headers)
 
-        if response.status_code == 200:
-            records = response.json().get('records', [])
+# Function to search for a record by Record ID in all Airtable tables at once; the first hit wins
+def search_airtable_record(record_id):
+    executor = ThreadPoolExecutor(max_workers=len(AIRTABLE_BASE_IDS_AND_TABLES))
+    futures = {
+        executor.submit(query_airtable_base, base_id, table_name, f"RECORD_ID()='{record_id}'"): (base_id, table_name)
+        for base_id, table_name in AIRTABLE_BASE_IDS_AND_TABLES
+    }
+    try:
+        for future in as_completed(futures):
+            base_id, table_name = futures[future]
+            try:
+                records = future.result()
+            except Exception as e:
+                print(f"Failed to search Airtable base {base_id}, table {table_name}: {e}")
+                continue
             if records:
                 return records[0], base_id, table_name  # Return the first matching record and its base/table details
+    finally:
+        # Drop the lookups that have not started yet once we have an answer
+        executor.shutdown(wait=False, cancel_futures=True)
 
     return None, None, None  # If no record is found in any table
 
 
-# Function to update the email by prefixing a # symbol
-def update_airtable_email(record_id, base_id, table_name, email):
+# Function to search for many Record IDs at once: one OR(RECORD_ID()=...) query per chunk of IDs per base, all in parallel.
+# Returns a dict of record_id -> (record, base_id, table_name) for the IDs that were found.
+def search_airtable_records(record_ids):
+    record_ids = list(dict.fromkeys(record_ids))
+    found = {}
+    if not record_ids:
+        return found
+
+    executor = ThreadPoolExecutor(max_workers=LOOKUP_WORKERS)
+    futures = {}
+    for priority, (base_id, table_name) in enumerate(AIRTABLE_BASE_IDS_AND_TABLES):
+        for ids in chunked(record_ids, RECORD_ID_BATCH_SIZE):
+            filter_formula = "OR(" + ",".join(f"RECORD_ID()='{record_id}'" for record_id in ids) + ")"
+            future = executor.submit(query_airtable_base, base_id, table_name, filter_formula)
+            futures[future] = (priority, base_id, table_name)
+
+    priorities = {}
+    try:
+        for future in as_completed(futures):
+            priority, base_id, table_name = futures[future]
+            try:
+                records = future.result()
+            except Exception as e:
+                print(f"Failed to search Airtable base {base_id}, table {table_name}: {e}")
+                continue
+            for record in records:
+                # Keep the match from the earliest configured base, like the serial search did
+                if record['id'] not in found or priority < priorities[record['id']]:
+                    found[record['id']] = (record, base_id, table_name)
+                    priorities[record['id']] = priority
+            if len(found) == len(record_ids):
+                break  # Every ID resolved; the remaining lookups are cancelled below
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return found
+
+
+# Function to update the email by prefixing a # symbol.
+# The update is queued and sent in a batch PATCH; callback(success) is called once its outcome is known.
+def update_airtable_email(record_id, base_id, table_name, email, callback=None):
     if not email.startswith("#"):
         new_email = f"#{email}"
-    
-        update_data = {
-            "fields": {
-                'Email': new_email
-            }
-        }
 
-        headers = {
-            "Authorization": f"Bearer {AIRTABLE_API_KEY}",
-            "Content-Type": "application/json"
+        def on_result(success, record):
+            if not success:
+                print(f"Failed to update Airtable record {record_id}.")
+            if callback is not None:
+                callback(success)
+
+        airtable_writer.update(base_id, table_name, record_id, {'Email': new_email}, callback=on_result)
+    else:
+        print(f"Email {email} already has a # prefix, no update needed.")
+        if callback is not None:
+            callback(True)
+
+
+# Function to build an in-memory index of email -> [(base_id, table_name, record_id, email), ...]
+# by scanning the Email field of every base once, in parallel. Emails already prefixed with # are left out.
+# Keys are the exact Email values, matching the Email='...' lookups the index replaces.
+def build_email_index():
+    headers = {
+        "Authorization": f"Bearer {AIRTABLE_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    params = {
+        "fields[]": "Email",
+        "filterByFormula": "AND({Email}, LEFT({Email}, 1) != '#')"
+    }
+
+    def scan_base(base_id, table_name):
+        url = f"https://api.airtable.com/v0/{base_id}/{table_name}"
+        entries = []
+        pages = 0
+        for records in iter_airtable_pages(url, headers, params):
+            pages += 1
+            for record in records:
+                email_field = record['fields'].get('Email')
+                if email_field and not email_field.startswith('#'):
+                    entries.append((email_field, (base_id, table_name, record['id'], email_field)))
+        return entries, pages
+
+    email_index = {}
+    total_pages = 0
+    with ThreadPoolExecutor(max_workers=LOOKUP_WORKERS) as executor:
+        futures = {
+            executor.submit(scan_base, base_id, table_name): (base_id, table_name)
+            for base_id, table_name in AIRTABLE_BASE_IDS_AND_TABLES
         }
+        # Merge in configured base order so lookups visit bases in the same order as before
+        for future, (base_id, table_name) in futures.items():
+            entries, pages = future.result()
+            total_pages += pages
+            print(f"Indexed {len(entries)} emails from base {base_id}, table {table_name}")
+            for key, entry in entries:
+                email_index.setdefault(key, []).append(entry)
+
+    # Remembered so later runs can tell whether an index is cheaper than per-email lookups
+    save_state(INDEX_PAGES_STATE_KEY, total_pages)
+    return email_index
+
+
+# Function to decide whether indexing every base costs fewer requests than one lookup per email per base
+def should_build_email_index(email_count):
+    estimated_pages = load_state(INDEX_PAGES_STATE_KEY, DEFAULT_INDEX_PAGES_PER_BASE * len(AIRTABLE_BASE_IDS_AND_TABLES))
+    return email_count * len(AIRTABLE_BASE_IDS_AND_TABLES) > estimated_pages
+
+
+# Function to drop a record from the email index once it has been handled elsewhere
+def forget_indexed_record(email_index, email, record_id):
+    if email_index is None:
+        return
+    entries = [entry for entry in email_index.get(email, []) if entry[2] != record_id]
+    if entries:
+        email_index[email] = entries
+    else:
+        email_index.pop(email, None)
 
-        update_url = f"https://api.airtable.com/v0/{base_id}/{table_name}/{record_id}"
-        response = requests.patch(update_url, json=update_data, headers=headers)
 
-        if response.status_code == 200:
-            return True
+# Function to queue the # prefix update for a record found by email
+def queue_email_prefix_update(record_id, base_id, table_name, email_field):
+    def on_updated(success):
+        if success:
+            print(f"Updated email {email_field} with # in base {base_id}, table {table_name}")
         else:
-            print(f"Failed to update Airtable record {record_id}: {response.status_code} - {response.text}")
-            return False
-    else:
-        print(f"Email {email} already has a # prefix, no update needed.")
-        return True
+            print(f"Failed to update email {email_field} in base {base_id}, table {table_name}")
 
+    # Call the update function to add # to the email
+    update_airtable_email(record_id, base_id, table_name, email_field, callback=on_updated)
+
+
+# Function to search for records by Email in multiple Airtable tables and update all occurrences of the email.
+# With an email index the matches come from memory; without one every base is queried.
+def search_and_update_email(email, email_index=None):
+    if email_index is not None:
+        # Matched entries are removed so later rows with the same email do not queue them again
+        for base_id, table_name, record_id, email_field in email_index.pop(email, []):
+            queue_email_prefix_update(record_id, base_id, table_name, email_field)
+        return
 
-# Function to search for records by Email in multiple Airtable tables and update all occurrences of the email
-def search_and_update_email(email):
     headers = {
         "Authorization": f"Bearer {AIRTABLE_API_KEY}",
         "Content-Type": "application/json"
@@ -81,7 +213,7 @@ def search_and_update_email(email):
     # Loop through all bases and tables to search for email
     for base_id, table_name in AIRTABLE_BASE_IDS_AND_TABLES:
         url = f"https://api.airtable.com/v0/{base_id}/{table_name}?filterByFormula=Email='{email}'"
-        response = requests.get(url, headers=headers)
+        response = get_session().get(url, headers=headers)
 
         if response.status_code == 200:
             records = response.json().get('records', [])
@@ -90,19 +222,13 @@ def search_and_update_email(email):
 
                 # Check if the email matches the email we're searching for and if it needs to be updated
                 if email_field and email_field == email and not email_field.startswith('#'):
-                    record_id = record['id']
-
-                    # Call the update function to add # to the email
-                    if update_airtable_email(record_id, base_id, table_name, email_field):
-                        print(f"Updated email {email_field} with # in base {base_id}, table {table_name}")
-                    else:
-                        print(f"Failed to update email {email_field} in base {base_id}, table {table_name}")
+                    queue_email_prefix_update(record['id'], base_id, table_name, email_field)
         else:
             print(f"Failed to search Airtable base {base_id}, table {table_name}: {response.status_code} - {response.text}")
 
 
 # Function to add email to a different Airtable table
-def add_email_to_airtable(email, web3_github, web3_external, ai_external, ai_github):
+def add_email_to_airtable(email, web3_github, web3_external, ai_external, ai_github, callback=None):
     # Airtable base and table where email needs to be added
     base_id = os.getenv('NEW_AIRTABLE_BASE_ID')
     table_name = os.getenv('NEW_AIRTABLE_TABLE_NAME')
@@ -120,21 +246,16 @@ def add_email_to_airtable(email, web3_github, web3_external, ai_external, ai_git
         }
     }
 
-    headers = {
-        "Authorization": f"Bearer {AIRTABLE_API_KEY}",
-        "Content-Type": "application/json"
-    }
-
-    # Insert the email into the specified Airtable base/table
-    insert_url = f"https://api.airtable.com/v0/{base_id}/{table_name}"
-    response = requests.post(insert_url, json=insert_data, headers=headers)
+    def on_result(success, record):
+        if success:
+            print(f"Email {email} successfully added to table {table_name} with status 'Checked'.")
+        else:
+            print(f"Failed to add email {email} to table {table_name}.")
+        if callback is not None:
+            callback(success)
 
-    if response.status_code == 200:
-        print(f"Email {email} successfully added to table {table_name} with status 'Checked'.")
-        return True
-    else:
-        print(f"Failed to add email {email} to table {table_name}: {response.status_code} - {response.text}")
-        return False
+    # Queue the insert into the specified Airtable base/table
+    airtable_writer.create(base_id, table_name, insert_data["fields"], callback=on_result)
 
 
 # Main function to process the Google Sheet and update Airtable records
@@ -142,6 +263,18 @@ def main():
     # Get all records from the Google Sheet
     records = sheet.get_all_values()
 
+    # Resolve every pending Record ID across all bases up front, in a few batched parallel queries
+    pending_ids = [
+        row[0] for row in records
+        if len(row) > 0 and not (len(row) > 1 and row[1].lower() == 'done')
+    ]
+    found_records = search_airtable_records(pending_ids)
+
+    # Index every base's emails once so the per-row "prefix with #" lookups are answered from memory,
+    # unless the few pending emails are cheaper to look up one by one than paging through every base
+    pending_emails = {record['fields'].get('Email') for record, _, _ in found_records.values()} - {None, ''}
+    email_index = build_email_index() if should_build_email_index(len(pending_emails)) else None
+
     # Loop through each record in the Google Sheet
     for i, row in enumerate(records, start=1):  # 'i' is the row index in the sheet (starting from 1)
         if len(row) == 0:
@@ -153,8 +286,8 @@ def main():
         if status.lower() == 'done':
             continue  # Skip already processed records
 
-        # Search for the record in Airtable by ID
-        record, base_id, table_name = search_airtable_record(record_id)
+        # Look up the record found by the batched search
+        record, base_id, table_name = found_records.get(record_id, (None, None, None))
 
         # Initialize the single-select field values
         web3_github = False
@@ -178,26 +311,40 @@ def main():
                 if base_id == os.getenv('AIRTABLE_BASE_ID_1') and table_name == os.getenv('AIRTABLE_TABLE_ID_1'):
                     ai_github = True  # Found in AI GitHub Table
 
-                # Update the email by adding # at the start if needed
-                if update_airtable_email(record_id, base_id, table_name, email):
-                    # Mark as done in Google Sheet
-                    sheet.update_cell(i, 2, 'Done')  # Update column B with 'Done'
-                    print(f"Updated record {record_id} and marked as done.")
-
-                    # Search for the same email in all other tables and update
-                    search_and_update_email(email)
-
-                    # Add the email to the specified base/table with single-select fields
-                    if add_email_to_airtable(email, web3_github, web3_external, ai_external, ai_github):
+                def on_added(success, email=email):
+                    if success:
                         print(f"Email {email} added to the new Airtable table with status 'Checked'.")
                     else:
                         print(f"Failed to add email {email} to the new Airtable table.")
-                else:
-                    print(f"Failed to update email for record {record_id}.")
+
+                def on_updated(success, i=i, record_id=record_id, email=email,
+                               flags=(web3_github, web3_external, ai_external, ai_github)):
+                    if success:
+                        # Mark as done in Google Sheet
+                        sheet.update_cell(i, 2, 'Done')  # Update column B with 'Done'
+                        print(f"Updated record {record_id} and marked as done.")
+
+                        # Search for the same email in all other tables and update
+                        search_and_update_email(email, email_index)
+
+                        # Add the email to the specified base/table with single-select fields
+                        add_email_to_airtable(email, *flags, callback=on_added)
+                    else:
+                        print(f"Failed to update email for record {record_id}.")
+
+                # This record is updated right here, so the email index must not queue it a second time
+                forget_indexed_record(email_index, email, record_id)
+
+                # Update the email by adding # at the start if needed; the write is sent in a batch
+                update_airtable_email(record_id, base_id, table_name, email, callback=on_updated)
             else:
                 print(f"No email field found for record {record_id}.")
         else:
             print(f"Record ID {record_id} not found in Airtable.")
 
+    # Send every update and insert still waiting in the buffer
+    succeeded, failed = airtable_writer.flush()
+    print(f"Airtable batch writes completed: {succeeded} succeeded, {failed} failed.")
+
 if __name__ == "__main__":
     main()
@@ -1,22 +1,20 @@
-import requests
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+from http_client import get_session
 from datetime import datetime
 import re
 import os
-import json 
+from google_sheets import LazyWorksheet
+from reconcile import iter_reconcile_streams, ADDED, COMMON
+from sheet_sink import BufferedSheetSink
+from airtable_writer import AirtableWriteBuffer
+from suppressions import get_group_suppressions, fetch_new_suppressions
 
 # SendGrid and Unsubscribe Group ID for personalized unsubscribes
 SENDGRID_API_KEY = os.getenv('SENDGRID_API_KEY')
 PERSONALIZED_UNSUBSCRIBE_GROUP_ID = 26120
 
-# Google Sheets
-scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-with open('credentials.json') as creds_file:
-    creds_json = json.load(creds_file)
-creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_json, scope)
-client = gspread.authorize(creds)
-personalized_sheet = client.open_by_url("https://docs.google.com/spreadsheets/d/18ORZTfeVGVCo7Wx4wzQMhMVPseCnGRT3W1wKEGNhSaw/edit#gid=0").worksheet('PersonalizedUnsub')
+# Google Sheets (credentials are read and the sheet opened on first use)
+personalized_sheet = LazyWorksheet("https://docs.google.com/spreadsheets/d/18ORZTfeVGVCo7Wx4wzQMhMVPseCnGRT3W1wKEGNhSaw/edit#gid=0", 'PersonalizedUnsub')
+personalized_sheet_sink = BufferedSheetSink(personalized_sheet, journal_path=".sheet_journal_personalized_unsub.jsonl")
 
 # Airtable
 AIRTABLE_API_KEY = os.getenv('AIRTABLE_API_KEY')
@@ -24,6 +22,12 @@ AIRTABLE_BASE_ID = os.getenv('AIRTABLE_BASE_ID')
 AIRTABLE_TABLE_NAME = os.getenv('AIRTABLE_TABLE_NAME')
 AIRTABLE_URL = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{AIRTABLE_TABLE_NAME}"
 
+# Buffered writer that sends record updates in 10-record batches
+airtable_writer = AirtableWriteBuffer(AIRTABLE_API_KEY)
+# Record ID -> the update queued for it in the current run. FIND() is a substring match, so several emails can resolve
+# to the same record; they share one PATCH instead of each appending to the same stale snapshot. Cleared by main().
+queued_updates = {}
+
 # Function to normalize email by decapitalizing, removing aliases, etc.
 def normalize_email(email):
     email = email.lower()
@@ -32,20 +36,11 @@ def normalize_email(email):
 
 # Function to get unsubscribes from a specific suppression group in SendGrid
 def get_personalized_unsubscribes():
-    url = f"https://api.sendgrid.com/v3/asm/groups/{PERSONALIZED_UNSUBSCRIBE_GROUP_ID}/suppressions"
-    
-    headers = {
-        "Authorization": f"Bearer {SENDGRID_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
-    response = requests.get(url, headers=headers)
-    
-    if response.status_code == 200:
-        unsubscribes = response.json()
-        return unsubscribes
-    else:
-        raise Exception(f"Failed to get personalized unsubscribes: {response.status_code} - {response.text}")
+    return get_group_suppressions(PERSONALIZED_UNSUBSCRIBE_GROUP_ID, SENDGRID_API_KEY)
+
+# Function to get only the unsubscribes that were not synced in an earlier run, plus the cursor to commit afterwards
+def get_new_personalized_unsubscribes():
+    return fetch_new_suppressions(PERSONALIZED_UNSUBSCRIBE_GROUP_ID, SENDGRID_API_KEY, normalize=normalize_email)
 
 # Function to get emails from the PersonalizedUnsub Google Sheet
 def get_emails_from_personalized_sheet():
@@ -60,10 +55,12 @@ def search_airtable_record(email):
     
     filter_formula = f"FIND('{email}', {{Email}})"
     params = {
-        "filterByFormula": filter_formula
+        "filterByFormula": filter_formula,
+        # Only the fields the update needs, so the search result can be written back without re-reading the record
+        "fields[]": ["Email", "Consent Snapshot"]
     }
     
-    response = requests.get(AIRTABLE_URL, headers=headers, params=params)
+    response = get_session().get(AIRTABLE_URL, headers=headers, params=params)
     
     if response.status_code == 200:
         records = response.json().get('records', [])
@@ -71,76 +68,107 @@ def search_airtable_record(email):
     else:
         raise Exception(f"Failed to search Airtable for {email}: {response.status_code} - {response.text}")
 
-# Function to update Airtable record for personalized mailing
-def update_airtable_personalized_record(record_id, email):
-    # Fetch the current record to check the 'Consent Snapshot' field
-    headers = {
-        "Authorization": f"Bearer {AIRTABLE_API_KEY}",
-        "Content-Type": "application/json"
-    }
+# Function to queue the Airtable update for a record returned by search_airtable_record.
+# The record already carries its 'Consent Snapshot', so no extra GET is needed; the PATCH is sent in a 10-record batch
+# and callback(success) is called once the batch has been written. A record already queued in this run gets the new
+# entry appended to its queued snapshot.
+def update_airtable_personalized_record(record, email, callback=None):
+    new_entry = f"Personalized Mailing - Consent Revoked - {datetime.now().strftime('%Y-%m-%d')} - N/A - Link in Mailing"
+    queued = queued_updates.get(record['id'])
+    if queued is not None and not queued['sent']:
+        # Not written yet: extend the queued PATCH so neither entry overwrites the other
+        queued['fields']['Consent Snapshot'] = f"{queued['fields']['Consent Snapshot']}, {new_entry}"
+        queued['callbacks'].append((email, callback))
+        return
     
-    # Retrieve the current record to check the existing 'Consent Snapshot'
-    record_url = f"{AIRTABLE_URL}/{record_id}"
-    response = requests.get(record_url, headers=headers)
+    # Build on what this run already wrote to the record, falling back to the snapshot the search returned
+    current_snapshot = queued['fields']['Consent Snapshot'] if queued is not None else record['fields'].get('Consent Snapshot', '')
     
-    if response.status_code == 200:
-        record = response.json()
-        current_snapshot = record['fields'].get('Consent Snapshot', '')
-        
-        # Determine the new snapshot value based on whether there's already data
-        if current_snapshot:
-            new_snapshot = f"{current_snapshot}, Personalized Mailing - Consent Revoked - {datetime.now().strftime('%Y-%m-%d')} - N/A - Link in Mailing"
-        else:
-            new_snapshot = f"Personalized Mailing - Consent Revoked - {datetime.now().strftime('%Y-%m-%d')} - N/A - Link in Mailing"
-        
-        # Update the record with the new snapshot and set 'InMailing Consent' to 'Consent Revoked'
-        update_data = {
-            "fields": {
-                'InMailing Consent': 'Consent Revoked',
-                'Consent Snapshot': new_snapshot
-            }
-        }
-        
-        # Send the update request
-        response = requests.patch(record_url, json=update_data, headers=headers)
-        
-        if response.status_code == 200:
-            return True
-        else:
-            print(f"Failed to update Airtable record for {email}: {response.status_code} - {response.text}")
-            return False
+    # Determine the new snapshot value based on whether there's already data
+    if current_snapshot:
+        new_snapshot = f"{current_snapshot}, {new_entry}"
     else:
-        print(f"Failed to retrieve Airtable record for {email}: {response.status_code} - {response.text}")
-        return False
+        new_snapshot = new_entry
+    
+    # Update the record with the new snapshot and set 'InMailing Consent' to 'Consent Revoked'
+    update_fields = {
+        'InMailing Consent': 'Consent Revoked',
+        'Consent Snapshot': new_snapshot
+    }
+    queued = queued_updates[record['id']] = {'fields': update_fields, 'callbacks': [(email, callback)], 'sent': False}
+    
+    def on_result(success, updated_record):
+        queued['sent'] = True
+        if not success:
+            # The snapshot was not written, so a later update must start again from the record's own
+            queued_updates.pop(record['id'], None)
+        for queued_email, queued_callback in queued['callbacks']:
+            if not success:
+                print(f"Failed to update Airtable record for {queued_email}")
+            if queued_callback is not None:
+                queued_callback(success)
+    
+    airtable_writer.update(AIRTABLE_BASE_ID, AIRTABLE_TABLE_NAME, record['id'], update_fields, callback=on_result)
 
 # Function to add email to PersonalizedUnsub Google Sheet
 def add_email_to_personalized_sheet(email):
-    personalized_sheet.append_row([email])
+    # Rows are journaled and written in batches with append_rows; see flush() in main
+    personalized_sheet_sink.append([email])
 
 # Main function
 def main():
-    personalized_unsubscribes = get_personalized_unsubscribes()
+    # Snapshots queued by an earlier run (under the daemon) are stale; every run starts from fresh search results
+    queued_updates.clear()
+    
+    # Only unsubscribes that were not synced in an earlier run need to be diffed against the sheet
+    personalized_unsubscribes, cursor = get_new_personalized_unsubscribes()
+    if not personalized_unsubscribes:
+        print("All personalized unsubscribed emails are already in the Google Sheet.")
+        cursor.commit()
+        return
     personalized_sheet_emails = get_emails_from_personalized_sheet()
     
-    # Normalize unsubscribes and find missing emails
-    missing_emails = [normalize_email(email) for email in personalized_unsubscribes if normalize_email(email) not in personalized_sheet_emails]
+    # Write rows a crashed run journaled but never appended, skipping any that did reach the sheet
+    personalized_sheet_emails = personalized_sheet_emails + [row[0] for row in personalized_sheet_sink.recover(personalized_sheet_emails)]
     
-    if missing_emails:
-        print("Emails not in PersonalizedUnsub Google Sheet:")
-        for email in missing_emails:
-            print(email)
-            # Search for the email in Airtable
-            records = search_airtable_record(email)
-            if records:
-                record_id = records[0]['id']
-                if update_airtable_personalized_record(record_id, email):
-                    print(f"Updated Airtable record for {email}")
-                    add_email_to_personalized_sheet(email)
-                    print(f"Added {email} to PersonalizedUnsub Google Sheet")
-            else:
-                print(f"No matching record found in Airtable for {email}")
-    else:
-        print("All personalized unsubscribed emails are already in the Google Sheet.")
+    # Stream the diff so a list too large for memory never has to be collected; emails already in the sheet
+    # need no further work
+    missing_found = False
+    try:
+        for status, email in iter_reconcile_streams(personalized_unsubscribes, personalized_sheet_emails, include_removed=False):
+            if status == COMMON:
+                cursor.mark_synced([email])
+                continue
+            if status == ADDED:
+                if not missing_found:
+                    print("Emails not in PersonalizedUnsub Google Sheet:")
+                    missing_found = True
+                print(email)
+                # Search for the email in Airtable
+                records = search_airtable_record(email)
+                if records:
+                    def on_updated(success, email=email):
+                        if success:
+                            print(f"Updated Airtable record for {email}")
+                            add_email_to_personalized_sheet(email)
+                            cursor.mark_synced([email])
+                            print(f"Added {email} to PersonalizedUnsub Google Sheet")
+                    
+                    # Queue the update on the record we just found; it is sent with up to 9 others
+                    update_airtable_personalized_record(records[0], email, callback=on_updated)
+                else:
+                    # A definite outcome: nothing to update, so the email must not keep the cursor from advancing
+                    print(f"No matching record found in Airtable for {email}")
+                    cursor.mark_synced([email])
+        if not missing_found:
+            print("All personalized unsubscribed emails are already in the Google Sheet.")
+    finally:
+        # Send the queued Airtable updates first; their callbacks add the rows to the sheet buffer
+        airtable_writer.flush()
+        # Write the remaining buffered rows, even when the loop stops early; the journal covers a hard crash
+        personalized_sheet_sink.flush()
+
+    cursor.commit()
 
 if __name__ == "__main__":
     main()
@@ -1,5 +1,6 @@
-import requests
 import os
+from airtable_reader import iter_airtable_records
+from airtable_writer import AirtableWriteBuffer
 
 # Set up Airtable API
 AIRTABLE_API_KEY = os.getenv('AIRTABLE_API_KEY')
@@ -11,6 +12,9 @@ AIRTABLE_BASE_IDS_AND_TABLES = [
     (os.getenv('AIRTABLE_BASE_ID_5'), os.getenv('AIRTABLE_TABLE_ID_5'))  
 ]
 
+# Buffered writer that sends record updates in 10-record batches
+airtable_writer = AirtableWriteBuffer(AIRTABLE_API_KEY)
+
 # Function to standardize email (remove the part after '+' in the local part)
 def standardize_email(email):
     try:
@@ -22,33 +26,19 @@ def standardize_email(email):
         print(f"Error standardizing email {email}: {e}")
         return email  # Return the original email if there is an error
 
-# Function to update email in Airtable
-def update_airtable_email(record_id, base_id, table_name, email_field_name, new_email):
-    update_data = {
-        "fields": {
-            email_field_name: new_email
-        }
-    }
-
-    headers = {
-        "Authorization": f"Bearer {AIRTABLE_API_KEY}",
-        "Content-Type": "application/json"
-    }
-
-    update_url = f"https://api.airtable.com/v0/{base_id}/{table_name}/{record_id}"
-    response = requests.patch(update_url, json=update_data, headers=headers)
+# Function to queue an email update in Airtable; the write is sent with up to 9 others in one batch PATCH
+def update_airtable_email(record_id, base_id, table_name, email_field_name, new_email, callback=None):
+    print(f"Queueing update of email for record {record_id} to {new_email}")
 
-    # Log the response from the update attempt
-    print(f"Attempting to update email for record {record_id} to {new_email}")
-    print(f"API response status: {response.status_code}")
-    print(f"API response text: {response.text}")
+    def on_result(success, record):
+        if success:
+            print(f"Successfully updated email {new_email} for record {record_id}")
+        else:
+            print(f"Failed to update Airtable record {record_id}.")
+        if callback is not None:
+            callback(success, record)
 
-    if response.status_code == 200:
-        print(f"Successfully updated email {new_email} for record {record_id}")
-        return True
-    else:
-        print(f"Failed to update Airtable record {record_id}: {response.status_code} - {response.text}")
-        return False
+    airtable_writer.update(base_id, table_name, record_id, {email_field_name: new_email}, callback=on_result)
 
 # Function to search for records containing a + symbol in the email and standardize them
 def search_and_standardize_emails():
@@ -58,7 +48,11 @@ def search_and_standardize_emails():
     }
 
     total_found = 0
-    total_updated = 0
+    updated = []
+
+    def count_update(success, record):
+        if success:
+            updated.append(record['id'])
 
     # Loop through all bases and tables to search for emails containing '+'
     for base_id, table_name in AIRTABLE_BASE_IDS_AND_TABLES:
@@ -71,43 +65,48 @@ def search_and_standardize_emails():
             email_field_name = "Email"
 
         # Filter records where the email contains '+'
-        url = f"https://api.airtable.com/v0/{base_id}/{table_name}?filterByFormula=FIND('+',{{{email_field_name}}})>0"
-        print(f"Request URL: {url}")
-        
-        response = requests.get(url, headers=headers)
-
-        if response.status_code == 200:
-            records = response.json().get('records', [])
-            found_count = len(records)
-            total_found += found_count
-            print(f"Found {found_count} records in base {base_id}, table {table_name} with {email_field_name} containing '+'")
-
-            # Process each record one by one
-            for record in records:
-                email_field = record['fields'].get(email_field_name)
-
-                # Log each email found and print it as requested
-                if email_field and '+' in email_field:
-                    print(f"Processing record ID: {record['id']}, Original Email: {email_field}")
-
-                    # Standardize the email (remove + and any alias part)
-                    new_email = standardize_email(email_field)
-
-                    # Log the standardized email before updating
-                    print(f"Standardized email: {new_email} (from {email_field})")
-
-                    # Update the email if changed
-                    if new_email != email_field:
-                        print(f"Updating record {record['id']} with new email: {new_email}")
-                        if update_airtable_email(record['id'], base_id, table_name, email_field_name, new_email):
-                            total_updated += 1
-                        else:
-                            print(f"Failed to update record {record['id']}.")
-                    else:
-                        print(f"No changes required for email {email_field}")
-
-        else:
-            print(f"Failed to search Airtable base {base_id}, table {table_name}: {response.status_code} - {response.text}")
+        url = f"https://api.airtable.com/v0/{base_id}/{table_name}"
+        params = {
+            "filterByFormula": f"FIND('+',{{{email_field_name}}})>0",
+            "fields[]": email_field_name
+        }
+        print(f"Request URL: {url} with filter {params['filterByFormula']}")
+
+        try:
+            # Read every page up front: updated records stop matching the filter and would shift later pages
+            records = list(iter_airtable_records(url, headers, params))
+        except Exception as e:
+            print(f"Failed to search Airtable base {base_id}, table {table_name}: {e}")
+            continue
+
+        found_count = len(records)
+        total_found += found_count
+        print(f"Found {found_count} records in base {base_id}, table {table_name} with {email_field_name} containing '+'")
+
+        # Queue each record; updates are flushed in batches of 10
+        for record in records:
+            email_field = record['fields'].get(email_field_name)
+
+            # Log each email found and print it as requested
+            if email_field and '+' in email_field:
+                print(f"Processing record ID: {record['id']}, Original Email: {email_field}")
+
+                # Standardize the email (remove + and any alias part)
+                new_email = standardize_email(email_field)
+
+                # Log the standardized email before updating
+                print(f"Standardized email: {new_email} (from {email_field})")
+
+                # Update the email if changed
+                if new_email != email_field:
+                    print(f"Updating record {record['id']} with new email: {new_email}")
+                    update_airtable_email(record['id'], base_id, table_name, email_field_name, new_email, callback=count_update)
+                else:
+                    print(f"No changes required for email {email_field}")
+
+    # Send any updates still waiting in the buffer
+    airtable_writer.flush()
+    total_updated = len(updated)
 
     # Final confirmation message
     print(f"Script completed. Total records found with '+': {total_found}")
@@ -0,0 +1,62 @@
+from http_client import get_session
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Airtable returns at most 100 records per page
+AIRTABLE_PAGE_SIZE = 100
+
+# Function to lazily yield pages of records from an Airtable table, following the 'offset' cursor
+def iter_airtable_pages(url, headers, params=None):
+    params = dict(params or {})
+    params.setdefault("pageSize", AIRTABLE_PAGE_SIZE)
+    page_number = 0
+
+    while True:
+        response = get_session().get(url, headers=headers, params=params)
+
+        if response.status_code != 200:
+            logger.error(f"Failed to fetch records from Airtable: {response.status_code} - {response.text}")
+            raise Exception(f"Failed to fetch records from Airtable: {response.status_code} - {response.text}")
+
+        data = response.json()
+        page_number += 1
+        records = data.get('records', [])
+        logger.debug(f"Fetched page {page_number} with {len(records)} records from {url}")
+        yield records
+
+        offset = data.get('offset')
+        if not offset:
+            break
+        params['offset'] = offset
+
+# Function to lazily yield every record of an Airtable table, one page in memory at a time
+def iter_airtable_records(url, headers, params=None):
+    for records in iter_airtable_pages(url, headers, params):
+        yield from records
+
+# Function to lazily yield normalized emails from the given field of every matching record.
+# on_record, if given, is called with every record before its emails are yielded.
+def iter_airtable_emails(url, headers, params=None, normalize=None, field='Email', on_record=None):
+    for record in iter_airtable_records(url, headers, params):
+        if on_record is not None:
+            on_record(record)
+        value = record['fields'].get(field)
+        if not value:
+            continue
+        logger.debug(f"Processing record: {record}")
+        if normalize is None:
+            yield value
+        else:
+            yield from normalize(value)
+
+# Function to group a (possibly lazy) iterable into lists of at most 'size' items
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
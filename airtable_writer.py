@@ -0,0 +1,97 @@
+import logging
+from http_client import get_session
+
+logger = logging.getLogger(__name__)
+
+# Airtable accepts at most 10 records per create/update request
+AIRTABLE_BATCH_SIZE = 10
+
+# Buffers Airtable record updates and creations per (base, table) and writes them in batches of 10.
+# Every queued write takes an optional callback(success, record) that is called once its batch has been sent.
+class AirtableWriteBuffer:
+    def __init__(self, api_key, batch_size=AIRTABLE_BATCH_SIZE):
+        self.api_key = api_key
+        self.batch_size = batch_size
+        self.pending = {}  # (method, base_id, table_name) -> [(payload, callback), ...]
+        self.succeeded = 0
+        self.failed = 0
+        self._flushing = False
+
+    def get_headers(self):
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+    # Queue a PATCH of the given fields on an existing record
+    def update(self, base_id, table_name, record_id, fields, callback=None):
+        self._add("PATCH", base_id, table_name, {"id": record_id, "fields": fields}, callback)
+
+    # Queue the creation of a new record with the given fields
+    def create(self, base_id, table_name, fields, callback=None):
+        self._add("POST", base_id, table_name, {"fields": fields}, callback)
+
+    def _add(self, method, base_id, table_name, payload, callback):
+        key = (method, base_id, table_name)
+        queue = self.pending.setdefault(key, [])
+        queue.append((payload, callback))
+        # Callbacks may queue more writes while a flush is running; flush() picks those up itself
+        if len(queue) >= self.batch_size and not self._flushing:
+            self._flush_key(key)
+
+    # Send every queued write, including writes queued by callbacks while flushing
+    def flush(self):
+        self._flushing = True
+        try:
+            while any(self.pending.values()):
+                for key in list(self.pending):
+                    self._flush_key(key)
+        finally:
+            self._flushing = False
+        return self.succeeded, self.failed
+
+    def _flush_key(self, key):
+        queue = self.pending.get(key, [])
+        while queue:
+            batch = queue[:self.batch_size]
+            del queue[:self.batch_size]
+            self._send_batch(key, batch)
+
+    def _send_batch(self, key, batch):
+        method, base_id, table_name = key
+        url = f"https://api.airtable.com/v0/{base_id}/{table_name}"
+        data = {"records": [payload for payload, _ in batch]}
+
+        try:
+            response = get_session().request(method, url, json=data, headers=self.get_headers())
+        except Exception as e:
+            logger.error(f"Failed to send {method} batch of {len(batch)} records to {base_id}/{table_name}: {e}")
+            response = None
+
+        if response is not None and response.status_code == 200:
+            records = response.json().get('records', [])
+            logger.info(f"{method} batch of {len(batch)} records to {base_id}/{table_name} succeeded")
+            for index, (payload, callback) in enumerate(batch):
+                record = records[index] if index < len(records) else payload
+                self._report(callback, True, record)
+        elif response is not None and 400 <= response.status_code < 500 and response.status_code != 429 and len(batch) > 1:
+            # Airtable rejects a batch as a whole when one record is invalid (422) or gone (404/403); split it
+            # until the bad records are isolated so they do not hold back the rest of the batch
+            logger.warning(f"{method} batch of {len(batch)} records to {base_id}/{table_name} rejected with "
+                           f"{response.status_code}; retrying in halves")
+            middle = len(batch) // 2
+            self._send_batch(key, batch[:middle])
+            self._send_batch(key, batch[middle:])
+        else:
+            if response is not None:
+                logger.error(f"Failed {method} batch of {len(batch)} records to {base_id}/{table_name}: {response.status_code} - {response.text}")
+            for payload, callback in batch:
+                self._report(callback, False, payload)
+
+    def _report(self, callback, success, record):
+        if success:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        if callback is not None:
+            callback(success, record)
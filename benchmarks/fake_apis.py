@@ -0,0 +1,792 @@
+import io
+import json
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from datetime import datetime
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from requests.adapters import BaseAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+# In-process stand-ins for the Airtable, SendGrid, GitHub and Google Sheets APIs the sync scripts use.
+# FakeTransport is mounted on the shared http_client session, so the scripts run unchanged against local data.
+
+
+# Function to build a requests Response for a fake endpoint
+def make_response(request, status_code, body=None, headers=None):
+    response = Response()
+    response.status_code = status_code
+    response.request = request
+    response.url = request.url
+    response.headers = CaseInsensitiveDict(headers or {})
+    if body is None:
+        content = b''
+    elif isinstance(body, (bytes, str)):
+        content = body.encode('utf-8') if isinstance(body, str) else body
+        response.headers.setdefault('Content-Type', 'text/plain; charset=utf-8')
+    else:
+        content = json.dumps(body).encode('utf-8')
+        response.headers.setdefault('Content-Type', 'application/json')
+    response.raw = io.BytesIO(content)
+    response._content = content
+    response.encoding = 'utf-8'
+    return response
+
+
+# Function to read a JSON request body
+def read_json(request):
+    if not request.body:
+        return {}
+    body = request.body.decode('utf-8') if isinstance(request.body, bytes) else request.body
+    return json.loads(body)
+
+
+# Sliding one-second window limiter used to emulate per-base / per-endpoint rate limits
+class FakeRateLimit:
+    def __init__(self, requests_per_second, penalty=1.0):
+        self.requests_per_second = requests_per_second
+        self.penalty = penalty
+        self.windows = defaultdict(deque)
+        self.blocked_until = {}
+        self.throttled = 0
+        self.lock = threading.Lock()
+
+    # Function to check a request; returns the Retry-After seconds when it must be rejected with a 429
+    def check(self, key):
+        if not self.requests_per_second:
+            return None
+        with self.lock:
+            now = time.monotonic()
+            if self.blocked_until.get(key, 0) > now:
+                self.throttled += 1
+                return self.blocked_until[key] - now
+            window = self.windows[key]
+            while window and window[0] <= now - 1.0:
+                window.popleft()
+            if len(window) >= self.requests_per_second:
+                self.blocked_until[key] = now + self.penalty
+                self.throttled += 1
+                return self.penalty
+            window.append(now)
+            return None
+
+
+# ---------------------------------------------------------------------------
+# Airtable formulas
+# ---------------------------------------------------------------------------
+
+FORMULA_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+      | (?P<field>\{[^}]*\})
+      | (?P<number>\d+(?:\.\d+)?)
+      | (?P<op>!=|>=|<=|=|>|<|&)
+      | (?P<punct>[(),])
+      | (?P<name>[A-Za-z_][A-Za-z0-9_ ]*?(?=\s*[(),=!<>&]|\s*$))
+    )""", re.VERBOSE)
+
+
+# Field values are indexed by their comma/whitespace separated parts, so "a@x.com, b@y.com" is found by either email
+TOKEN_SPLIT = re.compile(r'[\s,;]+')
+TOKEN_LIKE = re.compile(r'\w')
+
+
+def _parse_timestamp(value):
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+
+
+# Tiny evaluator for the subset of Airtable's filterByFormula language the scripts send
+class Formula:
+    def __init__(self, text):
+        self.tokens = []
+        position = 0
+        text = text.strip()
+        while position < len(text):
+            match = FORMULA_TOKEN.match(text, position)
+            if not match or match.end() == position:
+                raise ValueError(f"Cannot parse formula near: {text[position:]!r}")
+            kind = match.lastgroup
+            self.tokens.append((kind, match.group(kind).strip()))
+            position = match.end()
+        self.position = 0
+        self.tree = self._comparison()
+        if self.position != len(self.tokens):
+            raise ValueError(f"Unexpected trailing tokens in formula: {text!r}")
+
+    def _peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def _take(self, value=None):
+        token = self._peek()
+        if value is not None and token[1] != value:
+            raise ValueError(f"Expected {value!r}, got {token[1]!r}")
+        self.position += 1
+        return token
+
+    def _comparison(self):
+        left = self._primary()
+        kind, value = self._peek()
+        if kind == 'op':
+            self._take()
+            return ('op', value, left, self._primary())
+        return left
+
+    def _primary(self):
+        kind, value = self._take()
+        if kind == 'string':
+            return ('value', value[1:-1].replace("\\'", "'").replace('\\"', '"'))
+        if kind == 'number':
+            return ('value', float(value))
+        if kind == 'field':
+            return ('field', value[1:-1])
+        if kind == 'punct' and value == '(':
+            node = self._comparison()
+            self._take(')')
+            return node
+        if kind == 'name':
+            if self._peek() == ('punct', '('):
+                self._take('(')
+                args = []
+                if self._peek() != ('punct', ')'):
+                    args.append(self._comparison())
+                    while self._peek() == ('punct', ','):
+                        self._take(',')
+                        args.append(self._comparison())
+                self._take(')')
+                return ('call', value.upper(), args)
+            return ('field', value)
+        raise ValueError(f"Unexpected token {value!r}")
+
+    def evaluate(self, record):
+        return self._eval(self.tree, record)
+
+    def _eval(self, node, record):
+        kind = node[0]
+        if kind == 'value':
+            return node[1]
+        if kind == 'field':
+            return record['fields'].get(node[1], '')
+        if kind == 'op':
+            left = self._eval(node[2], record)
+            right = self._eval(node[3], record)
+            if node[1] == '&':
+                return f"{left}{right}"
+            if isinstance(left, float) or isinstance(right, float):
+                left = float(left or 0)
+                right = float(right or 0)
+            else:
+                left = '' if left is None else str(left)
+                right = '' if right is None else str(right)
+            return {
+                '=': left == right, '!=': left != right,
+                '>': left > right, '<': left < right,
+                '>=': left >= right, '<=': left <= right,
+            }[node[1]]
+        name, args = node[1], node[2]
+        if name == 'AND':
+            return all(self._eval(arg, record) for arg in args)
+        if name == 'OR':
+            return any(self._eval(arg, record) for arg in args)
+        if name == 'NOT':
+            return not self._eval(args[0], record)
+        if name == 'RECORD_ID':
+            return record['id']
+        if name == 'FIND':
+            needle = str(self._eval(args[0], record))
+            haystack = str(self._eval(args[1], record) or '')
+            return float(haystack.find(needle) + 1)
+        if name == 'LEFT':
+            return str(self._eval(args[0], record) or '')[:int(self._eval(args[1], record))]
+        if name == 'IS_AFTER':
+            left = self._eval(args[0], record)
+            right = self._eval(args[1], record)
+            if not left or not right:
+                return False
+            return _parse_timestamp(left) > _parse_timestamp(right)
+        raise ValueError(f"Unsupported formula function {name}")
+
+
+# ---------------------------------------------------------------------------
+# Airtable
+# ---------------------------------------------------------------------------
+
+class FakeAirtable:
+    host = 'api.airtable.com'
+
+    def __init__(self, requests_per_second=5, penalty=1.0, page_size_max=100):
+        self.tables = defaultdict(list)      # (base_id, table_name) -> [record, ...]
+        self.index = {}                      # record_id -> record
+        self.locations = {}                  # record_id -> (base_id, table_name, position)
+        self.rate_limit = FakeRateLimit(requests_per_second, penalty)
+        self.page_size_max = page_size_max
+        self.formula_cache = {}
+        self.token_indexes = {}              # (base_id, table_name, field) -> {token: [record, ...]}
+        self.versions = defaultdict(int)     # (base_id, table_name) -> change counter
+        self.match_cache = {}                # (base_id, table_name, formula) -> (version, matching records)
+        self.lock = threading.Lock()
+
+    # Function to add a record to a table and return it
+    def add_record(self, base_id, table_name, fields, record_id=None):
+        record = {
+            'id': record_id or 'rec' + uuid.uuid4().hex[:14],
+            'createdTime': datetime.utcnow().isoformat() + 'Z',
+            'fields': dict(fields),
+        }
+        with self.lock:
+            table = self.tables[(base_id, table_name)]
+            self.locations[record['id']] = (base_id, table_name, len(table))
+            table.append(record)
+            self.index[record['id']] = record
+            self.versions[(base_id, table_name)] += 1
+            for field, value in record['fields'].items():
+                self._index_value(base_id, table_name, field, value, record)
+        return record
+
+    def _index_value(self, base_id, table_name, field, value, record, remove=False):
+        index = self.token_indexes.get((base_id, table_name, field))
+        if index is None or not isinstance(value, str):
+            return
+        for token in set(TOKEN_SPLIT.split(value)):
+            if remove:
+                entries = index.get(token, [])
+                if record in entries:
+                    entries.remove(record)
+            elif token:
+                index.setdefault(token, []).append(record)
+
+    def _token_index(self, base_id, table_name, field):
+        key = (base_id, table_name, field)
+        with self.lock:
+            if key not in self.token_indexes:
+                self.token_indexes[key] = {}
+                for record in self.tables[(base_id, table_name)]:
+                    self._index_value(base_id, table_name, field, record['fields'].get(field), record)
+            return self.token_indexes[key]
+
+    # Function to narrow a formula down to candidate records through the id and token indexes, or None for a full scan.
+    # Candidates are still evaluated against the formula; a FIND for a fragment that is not a whole token falls back to a scan.
+    def _candidates(self, node, base_id, table_name):
+        kind = node[0]
+        if kind == 'call' and node[1] == 'FIND' and node[2][0][0] == 'value' and node[2][1][0] == 'field':
+            needle = node[2][0][1]
+            if TOKEN_SPLIT.search(needle) or not needle or not TOKEN_LIKE.search(needle):
+                return None
+            return self._token_index(base_id, table_name, node[2][1][1]).get(needle, [])
+        if kind == 'op' and node[1] == '=' and node[3][0] == 'value':
+            left = node[2]
+            if left[0] == 'call' and left[1] == 'RECORD_ID':
+                record = self.index.get(node[3][1])
+                if record is None or self.locations[record['id']][:2] != (base_id, table_name):
+                    return []
+                return [record]
+            if left[0] == 'field' and isinstance(node[3][1], str) and not TOKEN_SPLIT.search(node[3][1]):
+                return self._token_index(base_id, table_name, left[1]).get(node[3][1], [])
+        if kind == 'call' and node[1] == 'OR':
+            candidates = [self._candidates(arg, base_id, table_name) for arg in node[2]]
+            if any(candidate is None for candidate in candidates):
+                return None
+            return list({id(record): record for group in candidates for record in group}.values())
+        if kind == 'call' and node[1] == 'AND':
+            for arg in node[2]:
+                candidates = self._candidates(arg, base_id, table_name)
+                if candidates is not None:
+                    return candidates
+        return None
+
+    def records(self, base_id, table_name):
+        return self.tables[(base_id, table_name)]
+
+    def _formula(self, text):
+        if text not in self.formula_cache:
+            self.formula_cache[text] = Formula(text)
+        return self.formula_cache[text]
+
+    def handle(self, request, parts, query):
+        segments = [unquote(segment) for segment in parts.path.strip('/').split('/')]
+        if len(segments) < 3 or segments[0] != 'v0':
+            return make_response(request, 404, {'error': 'NOT_FOUND'})
+        base_id, table_name = segments[1], segments[2]
+        record_id = segments[3] if len(segments) > 3 else None
+
+        retry_after = self.rate_limit.check(base_id)
+        if retry_after is not None:
+            return make_response(request, 429, {'errors': [{'error': 'RATE_LIMIT_REACHED'}]},
+                                 {'Retry-After': f"{retry_after:.3f}"})
+
+        method = request.method
+        if method == 'GET' and record_id:
+            record = self.index.get(record_id)
+            if record is None:
+                return make_response(request, 404, {'error': 'NOT_FOUND'})
+            return make_response(request, 200, record)
+        if method == 'GET':
+            return self._list(request, base_id, table_name, query)
+        if method in ('PATCH', 'PUT'):
+            return self._update(request, base_id, table_name, record_id)
+        if method == 'POST':
+            return self._create(request, base_id, table_name)
+        return make_response(request, 405, {'error': 'METHOD_NOT_ALLOWED'})
+
+    def _list(self, request, base_id, table_name, query):
+        records = self.records(base_id, table_name)
+        formula_text = query.get('filterByFormula', [None])[0]
+        if formula_text:
+            # Later pages of the same query reuse the first page's matches while the table is unchanged
+            cache_key = (base_id, table_name, formula_text)
+            version = self.versions[(base_id, table_name)]
+            cached = self.match_cache.get(cache_key)
+            if cached is not None and cached[0] == version:
+                matching = cached[1]
+            else:
+                try:
+                    formula = self._formula(formula_text)
+                except ValueError as e:
+                    return make_response(request, 422, {'error': {'type': 'INVALID_FILTER_BY_FORMULA', 'message': str(e)}})
+                candidates = self._candidates(formula.tree, base_id, table_name)
+                if candidates is None:
+                    candidates = records
+                else:
+                    # Keep table order so offsets stay stable across pages
+                    candidates = sorted(candidates, key=lambda record: self.locations[record['id']][2])
+                matching = [record for record in candidates if formula.evaluate(record)]
+                if len(matching) > self.page_size_max:
+                    self.match_cache[cache_key] = (version, matching)
+        else:
+            matching = records
+
+        page_size = min(int(query.get('pageSize', [self.page_size_max])[0]), self.page_size_max)
+        start = int(query.get('offset', ['0'])[0])
+        page = matching[start:start + page_size]
+
+        fields = query.get('fields[]')
+        if fields:
+            page = [{**record, 'fields': {k: v for k, v in record['fields'].items() if k in fields}} for record in page]
+
+        body = {'records': page}
+        if start + page_size < len(matching):
+            body['offset'] = str(start + page_size)
+        return make_response(request, 200, body)
+
+    def _update(self, request, base_id, table_name, record_id):
+        data = read_json(request)
+        updates = [{'id': record_id, 'fields': data.get('fields', {})}] if record_id else data.get('records', [])
+        if len(updates) > 10:
+            return make_response(request, 422, {'error': {'type': 'INVALID_RECORDS', 'message': 'At most 10 records'}})
+        updated = []
+        for update in updates:
+            record = self.index.get(update['id'])
+            if record is None:
+                return make_response(request, 404, {'error': 'NOT_FOUND'})
+            with self.lock:
+                for field, value in update.get('fields', {}).items():
+                    self._index_value(base_id, table_name, field, record['fields'].get(field), record, remove=True)
+                    self._index_value(base_id, table_name, field, value, record)
+                record['fields'].update(update.get('fields', {}))
+                self.versions[(base_id, table_name)] += 1
+            updated.append(record)
+        return make_response(request, 200, updated[0] if record_id else {'records': updated})
+
+    def _create(self, request, base_id, table_name):
+        data = read_json(request)
+        creates = data['records'] if 'records' in data else [{'fields': data.get('fields', {})}]
+        if len(creates) > 10:
+            return make_response(request, 422, {'error': {'type': 'INVALID_RECORDS', 'message': 'At most 10 records'}})
+        created = [self.add_record(base_id, table_name, item.get('fields', {})) for item in creates]
+        return make_response(request, 200, {'records': created} if 'records' in data else created[0])
+
+
+# ---------------------------------------------------------------------------
+# SendGrid
+# ---------------------------------------------------------------------------
+
+class FakeSendGrid:
+    host = 'api.sendgrid.com'
+    upload_host = 'uploads.sendgrid.test'
+    max_contacts_per_request = 30000
+
+    def __init__(self, requests_per_second=0, penalty=1.0):
+        self.groups = defaultdict(dict)      # group_id -> {email: created_at}
+        self.contacts = {}
+        self.jobs = {}
+        self.rate_limit = FakeRateLimit(requests_per_second, penalty)
+        self.lock = threading.Lock()
+
+    def add_suppressions(self, group_id, emails):
+        now = int(time.time())
+        with self.lock:
+            for email in emails:
+                self.groups[str(group_id)].setdefault(email.lower(), now)
+
+    def handle(self, request, parts, query):
+        if parts.hostname == self.upload_host:
+            return self._upload(request, parts)
+
+        path = parts.path.rstrip('/')
+        endpoint = re.sub(r'/[^/]*@[^/]*', '/{email}', re.sub(r'/\d+', '/{id}', path))
+        retry_after = self.rate_limit.check(endpoint)
+        if retry_after is not None:
+            return make_response(request, 429, {'errors': [{'message': 'too many requests'}]},
+                                 {'X-RateLimit-Reset': str(time.time() + retry_after)})
+
+        method = request.method
+        match = re.fullmatch(r'/v3/asm/groups/(\d+)/suppressions(?:/(search|[^/]+))?', path)
+        if match:
+            group_id, tail = match.group(1), match.group(2)
+            group = self.groups[group_id]
+            if tail is None and method == 'GET':
+                return make_response(request, 200, list(group))
+            if tail is None and method == 'POST':
+                self.add_suppressions(group_id, read_json(request).get('recipient_emails', []))
+                return make_response(request, 201, {'recipient_emails': read_json(request).get('recipient_emails', [])})
+            if tail == 'search' and method == 'POST':
+                emails = read_json(request).get('recipient_emails', [])
+                return make_response(request, 200, [email for email in emails if email.lower() in group])
+            if tail and method == 'DELETE':
+                with self.lock:
+                    removed = group.pop(unquote(tail).lower(), None)
+                return make_response(request, 204 if removed is not None else 404)
+
+        if path == '/v3/marketing/contacts' and method == 'PUT':
+            contacts = read_json(request).get('contacts', [])
+            if len(contacts) > self.max_contacts_per_request:
+                return make_response(request, 400, {'errors': [{'message': 'too many contacts'}]})
+            return make_response(request, 202, {'job_id': self._finish_job([c['email'] for c in contacts])})
+
+        if path == '/v3/marketing/field_definitions' and method == 'GET':
+            return make_response(request, 200, {'reserved_fields': [{'id': '_rf2_T', 'name': 'email', 'field_type': 'Text'}]})
+
+        if path == '/v3/marketing/contacts/imports' and method == 'PUT':
+            job_id = uuid.uuid4().hex
+            self.jobs[job_id] = {'id': job_id, 'status': 'pending', 'results': {}}
+            return make_response(request, 200, {
+                'job_id': job_id,
+                'upload_uri': f"https://{self.upload_host}/{job_id}",
+                'upload_headers': [{'header': 'Content-Encoding', 'value': 'gzip'}],
+            })
+
+        match = re.fullmatch(r'/v3/marketing/contacts/imports/([0-9a-f]+)', path)
+        if match and method == 'GET':
+            job = self.jobs.get(match.group(1))
+            return make_response(request, 200 if job else 404, job or {'errors': [{'message': 'not found'}]})
+
+        return make_response(request, 404, {'errors': [{'message': f'unknown endpoint {method} {path}'}]})
+
+    def _finish_job(self, emails):
+        job_id = uuid.uuid4().hex
+        with self.lock:
+            for email in emails:
+                self.contacts[email.lower()] = {'email': email}
+            self.jobs[job_id] = {
+                'id': job_id, 'status': 'completed',
+                'results': {'requested_count': len(emails), 'created_count': len(emails), 'errored_count': 0},
+            }
+        return job_id
+
+    def _upload(self, request, parts):
+        import gzip
+        import csv
+        job_id = parts.path.strip('/')
+        text = gzip.decompress(request.body).decode('utf-8')
+        rows = list(csv.reader(io.StringIO(text)))[1:]
+        emails = [row[0] for row in rows if row]
+        with self.lock:
+            for email in emails:
+                self.contacts[email.lower()] = {'email': email}
+            self.jobs[job_id] = {
+                'id': job_id, 'status': 'completed',
+                'results': {'requested_count': len(emails), 'created_count': len(emails), 'errored_count': 0},
+            }
+        return make_response(request, 200)
+
+
+# ---------------------------------------------------------------------------
+# GitHub
+# ---------------------------------------------------------------------------
+
+class FakeGitHub:
+    hosts = ('api.github.com', 'raw.githubusercontent.com', 'github.com')
+
+    def __init__(self, rate_limit_per_key=5000, rate_limit_window=3600):
+        self.users = {}                      # login -> {'id', 'login', 'email', 'bio', 'readme'}
+        self.rate_limit_per_key = rate_limit_per_key
+        # REST ('core') and GraphQL calls draw on separate budgets, as on GitHub
+        self.remaining = {resource: defaultdict(lambda: self.rate_limit_per_key) for resource in ('core', 'graphql')}
+        self.rate_limit_window = rate_limit_window
+        self.reset_at = int(time.time()) + rate_limit_window
+        self.lock = threading.Lock()
+
+    def add_user(self, login, email=None, bio='', readme=None, website_url=None):
+        user = {
+            'id': len(self.users) + 1, 'login': login, 'email': email,
+            'bio': bio, 'readme': readme, 'websiteUrl': website_url,
+        }
+        self.users[login.lower()] = user
+        return user
+
+    def _rate_headers(self, key, resource='core'):
+        return {
+            'X-RateLimit-Limit': str(self.rate_limit_per_key),
+            'X-RateLimit-Remaining': str(max(0, self.remaining[resource][key])),
+            'X-RateLimit-Reset': str(self.reset_at),
+            'X-RateLimit-Resource': resource,
+        }
+
+    def _spend(self, request, resource='core'):
+        key = request.headers.get('Authorization', 'anonymous')
+        with self.lock:
+            if time.time() >= self.reset_at:
+                for remaining in self.remaining.values():
+                    remaining.clear()
+                self.reset_at = int(time.time()) + self.rate_limit_window
+            if self.remaining[resource][key] <= 0:
+                return key, False
+            self.remaining[resource][key] -= 1
+            return key, True
+
+    def handle(self, request, parts, query):
+        segments = [unquote(segment) for segment in parts.path.strip('/').split('/')]
+
+        if parts.hostname == 'raw.githubusercontent.com':
+            user = self.users.get(segments[0].lower()) if segments else None
+            if user and user['readme'] is not None:
+                etag = '"%s"' % uuid.uuid5(uuid.NAMESPACE_URL, user['readme']).hex
+                if request.headers.get('If-None-Match') == etag:
+                    return make_response(request, 304, None, {'ETag': etag})
+                return make_response(request, 200, user['readme'], {'ETag': etag})
+            return make_response(request, 404, '404: Not Found')
+
+        if parts.hostname == 'github.com':
+            user = self.users.get(segments[0].lower()) if segments else None
+            if user is None:
+                return make_response(request, 404, 'Not Found')
+            filler = '<div class="js-filler">' + 'x' * 2000 + '</div>\n'
+            bio = (f'<div class="p-note user-profile-bio mb-3 js-user-profile-bio f4" data-bio-text="{user["bio"]}">'
+                   f'<div>{user["bio"]}</div></div>') if user['bio'] else ''
+            return make_response(request, 200, f'<html><head></head><body>{filler * 20}{bio}{filler * 80}</body></html>')
+
+        if segments == ['rate_limit']:
+            key = request.headers.get('Authorization', 'anonymous')
+            return make_response(request, 200, {'rate': {
+                'limit': self.rate_limit_per_key, 'remaining': self.remaining['core'][key],
+                'reset': self.reset_at}}, self._rate_headers(key))
+
+        if segments == ['graphql'] and request.method == 'POST':
+            return self._graphql(request)
+
+        if len(segments) == 2 and segments[0] == 'users':
+            key, allowed = self._spend(request)
+            if not allowed:
+                return make_response(request, 403, {'message': 'API rate limit exceeded'}, self._rate_headers(key))
+            user = self.users.get(segments[1].lower())
+            if user is None:
+                return make_response(request, 404, {'message': 'Not Found'}, self._rate_headers(key))
+            body = {'login': user['login'], 'id': user['id'], 'email': user['email'],
+                    'bio': user['bio'] or None, 'blog': user['websiteUrl'] or ''}
+            etag = '"%s"' % uuid.uuid5(uuid.NAMESPACE_URL, json.dumps(body, sort_keys=True)).hex
+            headers = {**self._rate_headers(key), 'ETag': etag}
+            if request.headers.get('If-None-Match') == etag:
+                # Conditional hits do not count against the rate limit
+                with self.lock:
+                    self.remaining['core'][key] += 1
+                headers['X-RateLimit-Remaining'] = str(self.remaining['core'][key])
+                return make_response(request, 304, None, headers)
+            return make_response(request, 200, body, headers)
+
+        return make_response(request, 404, {'message': 'Not Found'})
+
+    def _graphql(self, request):
+        key, allowed = self._spend(request, 'graphql')
+        if not allowed:
+            return make_response(request, 403, {'message': 'API rate limit exceeded'}, self._rate_headers(key, 'graphql'))
+        query = read_json(request).get('query', '')
+        data, errors = {}, []
+        for alias, login in re.findall(r'(\w+)\s*:\s*user\(login:\s*"([^"]+)"\)', query):
+            user = self.users.get(login.lower())
+            data[alias] = None if user is None else {
+                'login': user['login'], 'databaseId': user['id'], 'email': user['email'] or '',
+                'websiteUrl': user['websiteUrl'], 'bio': user['bio'] or '',
+            }
+            if user is None:
+                errors.append({'type': 'NOT_FOUND', 'path': [alias],
+                               'message': f"Could not resolve to a User with the login of '{login}'."})
+        body = {'data': data, 'errors': errors} if errors else {'data': data}
+        return make_response(request, 200, body, self._rate_headers(key, 'graphql'))
+
+
+# ---------------------------------------------------------------------------
+# Google Sheets
+# ---------------------------------------------------------------------------
+
+def _cell_to_index(cell):
+    match = re.fullmatch(r'([A-Z]+)(\d+)', cell)
+    column = 0
+    for char in match.group(1):
+        column = column * 26 + (ord(char) - ord('A') + 1)
+    return int(match.group(2)), column
+
+
+# Worksheet stand-in implementing the gspread calls the scripts make
+class FakeWorksheet:
+    def __init__(self, title, rows=None, calls=None):
+        self.title = title
+        self.rows = [list(row) for row in (rows or [])]
+        self.calls = calls if calls is not None else defaultdict(int)
+        self.lock = threading.Lock()
+
+    def _count(self, name):
+        self.calls[name] += 1
+
+    @property
+    def row_count(self):
+        return len(self.rows)
+
+    def col_values(self, column):
+        self._count('col_values')
+        return [row[column - 1] for row in self.rows if len(row) >= column and row[column - 1] != '']
+
+    def row_values(self, row_index):
+        self._count('row_values')
+        row = self.rows[row_index - 1] if row_index <= len(self.rows) else []
+        return list(row)
+
+    def get_all_values(self):
+        self._count('get_all_values')
+        return [list(row) for row in self.rows]
+
+    def get_all_records(self):
+        self._count('get_all_records')
+        header = self.rows[0] if self.rows else []
+        return [dict(zip(header, row + [''] * (len(header) - len(row)))) for row in self.rows[1:]]
+
+    def get(self, range_name):
+        self._count('get')
+        start, end = range_name.split(':')
+        start_row, start_col = _cell_to_index(start)
+        end_row, end_col = _cell_to_index(end)
+        values = [row[start_col - 1:end_col] for row in self.rows[start_row - 1:end_row]]
+        while values and not any(values[-1]):
+            values.pop()
+        return values
+
+    def append_row(self, row):
+        self._count('append_row')
+        with self.lock:
+            self.rows.append(list(row))
+
+    def append_rows(self, rows):
+        self._count('append_rows')
+        with self.lock:
+            self.rows.extend(list(row) for row in rows)
+
+    def _set_cell(self, row_index, column, value):
+        while len(self.rows) < row_index:
+            self.rows.append([])
+        row = self.rows[row_index - 1]
+        while len(row) < column:
+            row.append('')
+        row[column - 1] = value
+
+    def update_cell(self, row_index, column, value):
+        self._count('update_cell')
+        with self.lock:
+            self._set_cell(row_index, column, value)
+
+    def batch_update(self, updates):
+        self._count('batch_update')
+        with self.lock:
+            for update in updates:
+                row_index, column = _cell_to_index(update['range'])
+                self._set_cell(row_index, column, update['values'][0][0])
+
+
+class FakeSpreadsheet:
+    def __init__(self, calls):
+        self.worksheets = {}
+        self.calls = calls
+
+    def add_worksheet(self, title, rows=None):
+        self.worksheets[title] = FakeWorksheet(title, rows, self.calls)
+        return self.worksheets[title]
+
+    @property
+    def sheet1(self):
+        return next(iter(self.worksheets.values()))
+
+    def worksheet(self, title):
+        self.calls['open_worksheet'] += 1
+        return self.worksheets[title]
+
+
+# gspread client stand-in
+class FakeSheetsClient:
+    def __init__(self):
+        self.spreadsheets = {}
+        self.calls = defaultdict(int)
+
+    def add_spreadsheet(self, url):
+        self.spreadsheets[url.split('#')[0]] = FakeSpreadsheet(self.calls)
+        return self.spreadsheets[url.split('#')[0]]
+
+    def open_by_url(self, url):
+        self.calls['open_by_url'] += 1
+        return self.spreadsheets[url.split('#')[0]]
+
+
+# ---------------------------------------------------------------------------
+# Transport
+# ---------------------------------------------------------------------------
+
+# requests transport adapter that routes every request to the matching fake service, with optional latency
+class FakeTransport(BaseAdapter):
+    def __init__(self, services, latency=0.0):
+        super().__init__()
+        self.routes = {}
+        for service in services:
+            for host in getattr(service, 'hosts', None) or (service.host,):
+                self.routes[host] = service
+            if getattr(service, 'upload_host', None):
+                self.routes[service.upload_host] = service
+        self.latency = latency
+        self.requests = defaultdict(int)
+        self.status_codes = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        parts = urlsplit(request.url)
+        service = self.routes.get(parts.hostname)
+        if self.latency:
+            time.sleep(self.latency)
+        if service is None:
+            response = make_response(request, 502, {'error': f'no fake for host {parts.hostname}'})
+        else:
+            response = service.handle(request, parts, parse_qs(parts.query, keep_blank_values=True))
+        with self.lock:
+            self.requests[parts.hostname] += 1
+            self.status_codes[response.status_code] += 1
+        return response
+
+    def close(self):
+        pass
+
+
+# Function to mount the fakes on the shared session and the Sheets factory.
+# Returns the transport so callers can read its request counters.
+def install_fakes(services, sheets_client=None, latency=0.0):
+    import http_client
+    import google_sheets
+
+    transport = FakeTransport(services, latency=latency)
+    session = http_client.get_session()
+    session.mount('https://', transport)
+    session.mount('http://', transport)
+
+    if sheets_client is not None:
+        with google_sheets._lock:
+            google_sheets._client = sheets_client
+            google_sheets._spreadsheets.clear()
+            google_sheets._worksheets.clear()
+    return transport
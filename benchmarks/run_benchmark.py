@@ -0,0 +1,316 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+from datetime import datetime, timedelta
+
+# Replays synthetic datasets through each sync script against the in-process fakes in benchmarks/fake_apis.py
+# and reports the requests made, wall time and peak memory. Every run happens in a fresh interpreter, because the
+# scripts read their configuration from the environment at import time and keep module-level clients.
+#
+#   python -m benchmarks.run_benchmark --scripts airtable_to_sendgrid,standardize --contacts 1000,100000
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MAIN_SPREADSHEET_URL = "https://docs.google.com/spreadsheets/d/18ORZTfeVGVCo7Wx4wzQMhMVPseCnGRT3W1wKEGNhSaw/edit#gid=0"
+SCRAPE_SPREADSHEET_URL = "https://docs.google.com/spreadsheets/d/1rKdG00VihG3zHRQLgQ6NteUHhdQxAqP2reLU8LCFotk/edit#gid=0"
+UNSUBSCRIBE_GROUP_ID = 18613
+PERSONALIZED_UNSUBSCRIBE_GROUP_ID = 26120
+
+# Environment every script is started with
+BENCHMARK_ENV = {
+    'AIRTABLE_API_KEY': 'fake-airtable-key',
+    'AIRTABLE_BASE_ID': 'appMain',
+    'AIRTABLE_TABLE_NAME': 'People',
+    'NEW_AIRTABLE_BASE_ID': 'appChecked',
+    'NEW_AIRTABLE_TABLE_NAME': 'Checked',
+    'SENDGRID_API_KEY': 'fake-sendgrid-key',
+    'MY_GITHUB_API_KEYS': 'fake-github-key-1,fake-github-key-2',
+}
+for number in range(1, 6):
+    BENCHMARK_ENV[f'AIRTABLE_BASE_ID_{number}'] = f'appBase{number}'
+    BENCHMARK_ENV[f'AIRTABLE_TABLE_ID_{number}'] = f'tblPeople{number}'
+
+
+def email_for(i):
+    return f"user{i}@example.com"
+
+
+def timestamp(age):
+    return (datetime.utcnow() - age).isoformat(timespec='milliseconds') + 'Z'
+
+
+# ---------------------------------------------------------------------------
+# Datasets: each builder fills the fakes for n contacts, of which `changed` need work in this run
+# ---------------------------------------------------------------------------
+
+def build_consent_table(fakes, n, changed, consent, field):
+    recent, old = timestamp(timedelta(minutes=5)), timestamp(timedelta(days=30))
+    other = 'Consent Given' if consent == 'Consent Revoked' else 'Consent Revoked'
+    for i in range(n):
+        fakes['airtable'].add_record('appMain', 'People', {
+            'Email': email_for(i),
+            'Newsletter Consent': consent if i < changed else other,
+            field: recent if i < changed else old,
+        })
+
+
+def build_airtable_to_sendgrid(fakes, n, changed):
+    build_consent_table(fakes, n, changed, 'Consent Revoked', 'Last Modified Newsletter Consent')
+    # Half of the revoked emails are already in the unsubscribe group
+    fakes['sendgrid'].add_suppressions(UNSUBSCRIBE_GROUP_ID, (email_for(i) for i in range(0, changed, 2)))
+
+
+def build_airtable_to_sendgrid_ncg(fakes, n, changed):
+    build_consent_table(fakes, n, changed, 'Consent Given', 'Last Modified Newsletter Consent')
+    fakes['sendgrid'].add_suppressions(UNSUBSCRIBE_GROUP_ID, (email_for(i) for i in range(0, changed, 2)))
+
+
+def build_airtable_to_sendgrid_newemail(fakes, n, changed):
+    build_consent_table(fakes, n, changed, 'Consent Given', 'Last Modified Main Email')
+
+
+def build_unsubscribe_sheet(fakes, n, changed, group_id, worksheet):
+    fakes['sendgrid'].add_suppressions(group_id, (email_for(i) for i in range(n)))
+    for i in range(n):
+        fakes['airtable'].add_record('appMain', 'People', {'Email': email_for(i), 'Consent Snapshot': ''})
+    # Every unsubscribe except the changed ones is already in the sheet
+    fakes['spreadsheets'][MAIN_SPREADSHEET_URL].worksheets[worksheet].rows = [[email_for(i)] for i in range(changed, n)]
+
+
+def build_sendgrid_to_airtable(fakes, n, changed):
+    build_unsubscribe_sheet(fakes, n, changed, UNSUBSCRIBE_GROUP_ID, 'Unsubscribes')
+
+
+def build_sendgrid_to_airtable_personalized(fakes, n, changed):
+    build_unsubscribe_sheet(fakes, n, changed, PERSONALIZED_UNSUBSCRIBE_GROUP_ID, 'PersonalizedUnsub')
+
+
+def build_exmailing_unsub(fakes, n, changed):
+    # Contacts are spread over four bases; every tenth one also appears in the next base
+    record_ids = []
+    for i in range(n):
+        base = i % 4 + 1
+        record = fakes['airtable'].add_record(f'appBase{base}', f'tblPeople{base}', {'Email': email_for(i)})
+        record_ids.append(record['id'])
+        if i % 10 == 0:
+            base = base % 4 + 1
+            fakes['airtable'].add_record(f'appBase{base}', f'tblPeople{base}', {'Email': email_for(i)})
+    rows = [[record_id, 'Done' if i >= changed else ''] for i, record_id in enumerate(record_ids)]
+    fakes['spreadsheets'][MAIN_SPREADSHEET_URL].worksheets['Exmailing'].rows = rows
+
+
+def build_standardize(fakes, n, changed):
+    for i in range(n):
+        base = i % 5 + 1
+        field = 'Main Email' if base == 5 else 'Email'
+        email = f"user{i}+news@example.com" if i < changed else email_for(i)
+        fakes['airtable'].add_record(f'appBase{base}', f'tblPeople{base}', {field: email})
+
+
+def build_cloud_scrap(fakes, n, changed):
+    rows = [['Username', 'User ID', 'Profile URL', 'Repo', 'Done?']]
+    for i in range(n):
+        login = f"dev{i}"
+        # Most users expose an email through the API, some only in their profile README, a few only in the bio
+        if i % 10 < 7:
+            fakes['github'].add_user(login, email=email_for(i))
+        elif i % 10 < 9:
+            fakes['github'].add_user(login, readme=f"# Hi\nReach me at {email_for(i)}\n")
+        else:
+            fakes['github'].add_user(login, bio=f"Builder. {email_for(i)}")
+        rows.append([login, str(i), f"https://github.com/{login}", f"{login}/project", '' if i < changed else 'Yes'])
+    spreadsheet = fakes['spreadsheets'][SCRAPE_SPREADSHEET_URL]
+    spreadsheet.worksheets['Sheet1'].rows = rows
+
+
+# Script name -> (module, entry point, dataset builder)
+SCRIPTS = {
+    'airtable_to_sendgrid': ('Airtable_to_sendgrid', 'main', build_airtable_to_sendgrid),
+    'airtable_to_sendgrid_ncg': ('Airtable_to_sendgrid_NCG', 'main', build_airtable_to_sendgrid_ncg),
+    'airtable_to_sendgrid_newemail': ('Airtable_to_sendgrid_newemail', 'main', build_airtable_to_sendgrid_newemail),
+    'sendgrid_to_airtable': ('Sendgrid_to_airtable', 'main', build_sendgrid_to_airtable),
+    'sendgrid_to_airtable_personalized': ('Sendgrid_to_airtable_personalized', 'main', build_sendgrid_to_airtable_personalized),
+    'exmailing_unsub': ('ExmailingUnsub', 'main', build_exmailing_unsub),
+    'standardize': ('Standardize', 'search_and_standardize_emails', build_standardize),
+    'cloud_scrap': ('CloudScrap', 'main', build_cloud_scrap),
+}
+
+
+# ---------------------------------------------------------------------------
+# Child process: one script, one dataset size
+# ---------------------------------------------------------------------------
+
+def build_fakes(options):
+    from benchmarks.fake_apis import FakeAirtable, FakeSendGrid, FakeGitHub, FakeSheetsClient
+
+    sheets = FakeSheetsClient()
+    main_spreadsheet = sheets.add_spreadsheet(MAIN_SPREADSHEET_URL)
+    for title in ('Unsubscribes', 'PersonalizedUnsub', 'Exmailing'):
+        main_spreadsheet.add_worksheet(title)
+    scrape_spreadsheet = sheets.add_spreadsheet(SCRAPE_SPREADSHEET_URL)
+    for title in ('Sheet1', 'Sheet2'):
+        scrape_spreadsheet.add_worksheet(title)
+
+    return {
+        'airtable': FakeAirtable(requests_per_second=options.airtable_rps, penalty=options.penalty),
+        'sendgrid': FakeSendGrid(requests_per_second=options.sendgrid_rps, penalty=options.penalty),
+        'github': FakeGitHub(),
+        'sheets': sheets,
+        'spreadsheets': {MAIN_SPREADSHEET_URL: main_spreadsheet, SCRAPE_SPREADSHEET_URL: scrape_spreadsheet},
+    }
+
+
+def run_child(options):
+    workdir = tempfile.mkdtemp(prefix='sync-benchmark-')
+    try:
+        run_in_workdir(options, workdir)
+    finally:
+        # The scripts' state, journal and cache files are only meaningful for this run
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_in_workdir(options, workdir):
+    os.environ.update(BENCHMARK_ENV)
+    os.environ['SYNC_STATE_PATH'] = os.path.join(workdir, 'sync_state.json')
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_ROOT)
+
+    import importlib
+    import http_client
+    import metrics
+    from rate_limiter import RateScheduler
+    from benchmarks.fake_apis import install_fakes
+
+    module_name, entry_name, build = SCRIPTS[options.script]
+    changed = max(1, int(options.contacts * options.change_rate))
+
+    fakes = build_fakes(options)
+    build(fakes, options.contacts, changed)
+
+    transport = install_fakes([fakes['airtable'], fakes['sendgrid'], fakes['github']],
+                              sheets_client=fakes['sheets'], latency=options.latency)
+    # The client-side limiter is set to the same rates as the fakes so runs can be sped up consistently
+    http_client.get_session().scheduler = RateScheduler(airtable_rate=options.airtable_rps or 1e9,
+                                                        sendgrid_rate=options.sendgrid_rps or 1e9)
+
+    module = importlib.import_module(module_name)
+    if not options.verbose:
+        logging.disable(logging.INFO)
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    error = None
+    try:
+        getattr(module, entry_name)()
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+    wall_time = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    result = {
+        'script': options.script,
+        'contacts': options.contacts,
+        'changed': changed,
+        'wall_time': round(wall_time, 3),
+        'peak_memory_mb': round(peak / (1024 * 1024), 2),
+        'requests': sum(transport.requests.values()),
+        'requests_by_host': dict(transport.requests),
+        'status_codes': {str(code): count for code, count in transport.status_codes.items()},
+        'throttled': fakes['airtable'].rate_limit.throttled + fakes['sendgrid'].rate_limit.throttled,
+        'sheets_calls': dict(fakes['sheets'].calls),
+        'endpoints': metrics.get_metrics().summary()['endpoints'],
+        'error': error,
+    }
+    with open(options.result_path, 'w') as result_file:
+        json.dump(result, result_file)
+
+
+# ---------------------------------------------------------------------------
+# Parent process
+# ---------------------------------------------------------------------------
+
+def run_one(script, contacts, options):
+    fd, result_path = tempfile.mkstemp(prefix='sync-benchmark-', suffix='.json')
+    os.close(fd)
+    command = [
+        sys.executable, '-m', 'benchmarks.run_benchmark', '--child',
+        '--script', script, '--contacts', str(contacts), '--result-path', result_path,
+        '--change-rate', str(options.change_rate), '--latency', str(options.latency),
+        '--airtable-rps', str(options.airtable_rps), '--sendgrid-rps', str(options.sendgrid_rps),
+        '--penalty', str(options.penalty),
+    ] + (['--verbose'] if options.verbose else [])
+    output = None if options.verbose else subprocess.DEVNULL
+    completed = subprocess.run(command, cwd=REPO_ROOT, stdout=output, stderr=output, timeout=options.timeout)
+    try:
+        with open(result_path) as result_file:
+            return json.load(result_file)
+    except ValueError:
+        return {'script': script, 'contacts': contacts, 'error': f"benchmark process exited with {completed.returncode}"}
+    finally:
+        os.remove(result_path)
+
+
+def print_result(result):
+    if 'wall_time' not in result:
+        print(f"{result['script']:<34} {result['contacts']:>9}  {result['error']}")
+        return
+    sheets_calls = sum(result['sheets_calls'].values())
+    print(f"{result['script']:<34} {result['contacts']:>9} {result['changed']:>8} {result['wall_time']:>9.2f}s "
+          f"{result['requests']:>9} {result['throttled']:>6} {sheets_calls:>7} {result['peak_memory_mb']:>9.1f}MB"
+          + (f"  {result['error']}" if result['error'] else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sync scripts against local fakes of their APIs.")
+    parser.add_argument('--scripts', default=','.join(SCRIPTS), help="Comma-separated scripts (default: all)")
+    parser.add_argument('--contacts', default='1000,10000', help="Comma-separated dataset sizes, e.g. 1000,100000,1000000")
+    parser.add_argument('--change-rate', type=float, default=0.01, help="Share of contacts that need work in the run")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every fake API call")
+    parser.add_argument('--airtable-rps', type=float, default=5, help="Per-base Airtable limit; 0 disables limiting")
+    parser.add_argument('--sendgrid-rps', type=float, default=10, help="Per-endpoint SendGrid limit; 0 disables limiting")
+    parser.add_argument('--penalty', type=float, default=1.0, help="Seconds a limited base/endpoint stays blocked after a 429")
+    parser.add_argument('--timeout', type=float, default=3600, help="Seconds before a single run is abandoned")
+    parser.add_argument('--output', help="Write all results to this JSON file")
+    parser.add_argument('--verbose', action='store_true', help="Show the scripts' own output")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--script', help=argparse.SUPPRESS)
+    parser.add_argument('--result-path', help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.child:
+        options.contacts = int(options.contacts)
+        run_child(options)
+        return
+
+    scripts = [name.strip() for name in options.scripts.split(',') if name.strip()]
+    unknown = [name for name in scripts if name not in SCRIPTS]
+    if unknown:
+        parser.error(f"Unknown scripts: {', '.join(unknown)} (known: {', '.join(SCRIPTS)})")
+    sizes = [int(size) for size in options.contacts.split(',') if size.strip()]
+
+    print(f"{'script':<34} {'contacts':>9} {'changed':>8} {'wall':>10} {'requests':>9} {'429s':>6} "
+          f"{'sheets':>7} {'peak mem':>11}")
+    results = []
+    for script in scripts:
+        for contacts in sizes:
+            result = run_one(script, contacts, options)
+            print_result(result)
+            results.append(result)
+
+    if options.output:
+        with open(options.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import re
+import codecs
+import html
+
+# Compiled once; the scrapers call these for every profile
+EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b')
+# Opening tag of the profile bio block (class list contains both p-note and user-profile-bio)
+BIO_START_PATTERN = re.compile(
+    r'<div\b(?=[^>]*\bclass="(?=[^"]*\bp-note\b)(?=[^"]*\buser-profile-bio\b)[^"]*")[^>]*>', re.IGNORECASE
+)
+DATA_BIO_TEXT_PATTERN = re.compile(r'\bdata-bio-text="([^"]*)"', re.IGNORECASE)
+DIV_TAG_PATTERN = re.compile(r'<(/?)div\b[^>]*>', re.IGNORECASE)
+TAG_PATTERN = re.compile(r'<[^>]+>')
+# Matches that look like emails but are not: retina image names, GitHub's private relay addresses
+NOT_EMAIL_PATTERN = re.compile(r'@\dx\.|\.(png|jpe?g|gif|svg|webp)$|@users\.noreply\.github\.com$', re.IGNORECASE)
+
+# Bytes read from a profile page per chunk
+CHUNK_SIZE = 16 * 1024
+# Tail of the text kept between chunks while looking for the bio block, so a tag split across chunks is still found
+SCAN_OVERLAP = 1024
+
+# Function to list the distinct plausible emails in a text, in order of appearance
+def extract_emails(text):
+    candidates = []
+    for match in EMAIL_PATTERN.findall(text or ''):
+        email = match.strip('\"<>[]()')
+        if email not in candidates and not NOT_EMAIL_PATTERN.search(email):
+            candidates.append(email)
+    return candidates
+
+# Function to get the first plausible email in a text, or None
+def extract_email(text):
+    candidates = extract_emails(text)
+    return candidates[0] if candidates else None
+
+# Function to get the emails in a bio block: its visible text first, then its data-bio-text attribute
+def extract_bio_emails(bio_html):
+    start_tag = BIO_START_PATTERN.match(bio_html)
+    visible_text = html.unescape(TAG_PATTERN.sub(' ', bio_html))
+    candidates = extract_emails(visible_text)
+    data_bio_text = DATA_BIO_TEXT_PATTERN.search(start_tag.group(0)) if start_tag else None
+    if data_bio_text:
+        candidates += [email for email in extract_emails(html.unescape(data_bio_text.group(1))) if email not in candidates]
+    return candidates
+
+# Function to find the bio block in a stream of page chunks (bytes) and return its emails.
+# Reading stops as soon as the block is closed, so the rest of the page is never downloaded or scanned.
+def scan_bio_emails(chunks):
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    buffer = ''
+    found = False
+    for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        if not found:
+            match = BIO_START_PATTERN.search(buffer)
+            if match is None:
+                buffer = buffer[-SCAN_OVERLAP:]
+                continue
+            buffer = buffer[match.start():]
+            found = True
+
+        # Find the </div> that closes the bio block, counting nested divs
+        depth = 0
+        for tag in DIV_TAG_PATTERN.finditer(buffer):
+            depth += -1 if tag.group(1) else 1
+            if depth == 0:
+                return extract_bio_emails(buffer[:tag.end()])
+    return extract_bio_emails(buffer) if found else []
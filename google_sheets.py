@@ -0,0 +1,90 @@
+import os
+import re
+import json
+import threading
+from metrics import time_call
+
+# Google Sheets API scope and service-account key file
+SCOPE = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+CREDENTIALS_PATH = os.getenv('GOOGLE_CREDENTIALS_PATH', 'credentials.json')
+
+_lock = threading.RLock()
+_client = None
+_spreadsheets = {}
+_worksheets = {}
+
+# Function to get the authorized gspread client; credentials are read and gspread/oauth2client imported on first use only
+def get_client():
+    global _client
+    with _lock:
+        if _client is None:
+            import gspread
+            from oauth2client.service_account import ServiceAccountCredentials
+
+            with open(CREDENTIALS_PATH) as creds_file:
+                creds_json = json.load(creds_file)
+            creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_json, SCOPE)
+            _client = gspread.authorize(creds)
+        return _client
+
+# Function to open a spreadsheet by URL once per process; calls on it and its worksheets are timed
+def get_spreadsheet(url):
+    with _lock:
+        if url not in _spreadsheets:
+            label = get_spreadsheet_key(url)
+            client = get_client()
+            with time_call('sheets', 'open_by_url', label):
+                _spreadsheets[url] = TimedSheet(client.open_by_url(url), label)
+        return _spreadsheets[url]
+
+# Function to get the spreadsheet key from its URL, used as the metrics label
+def get_spreadsheet_key(url):
+    match = re.search(r'/d/([^/]+)', url)
+    return match.group(1) if match else url
+
+# Function to open a worksheet once per process; without a name the first sheet is used
+def get_worksheet(url, name=None):
+    key = (url, name)
+    with _lock:
+        if key not in _worksheets:
+            spreadsheet = get_spreadsheet(url)
+            _worksheets[key] = spreadsheet.worksheet(name) if name else spreadsheet.sheet1
+        return _worksheets[key]
+
+# Stand-in for a gspread worksheet that opens the real one the first time it is used,
+# so scripts can keep module-level sheet objects without authenticating at import time.
+class LazyWorksheet:
+    def __init__(self, url, name=None):
+        self.url = url
+        self.name = name
+
+    def resolve(self):
+        return get_worksheet(self.url, self.name)
+
+    def __getattr__(self, attr):
+        return getattr(self.resolve(), attr)
+
+# Wrapper around a gspread spreadsheet or worksheet that records every method call in the metrics registry.
+# Worksheets handed out by a wrapped spreadsheet are wrapped as well, labelled with their title.
+class TimedSheet:
+    WORKSHEET_METHODS = ('worksheet', 'get_worksheet', 'add_worksheet')
+
+    def __init__(self, target, label):
+        self._target = target
+        self._label = label
+
+    def _wrap_worksheet(self, worksheet):
+        return TimedSheet(worksheet, f"{self._label}/{getattr(worksheet, 'title', '')}")
+
+    def __getattr__(self, attr):
+        value = getattr(self._target, attr)
+        if attr == 'sheet1':
+            return self._wrap_worksheet(value)
+        if not callable(value):
+            return value
+
+        def timed(*args, **kwargs):
+            with time_call('sheets', attr, self._label):
+                result = value(*args, **kwargs)
+            return self._wrap_worksheet(result) if attr in self.WORKSHEET_METHODS else result
+        return timed
@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from http_client import get_session
+from metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+# Upper bound for the bodies kept in a cache file; least recently used entries are evicted beyond it
+HTTP_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Response headers kept with a cached body
+CACHED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+# Persistent HTTP cache for conditional GETs, stored in SQLite and keyed by URL.
+# Responses with an ETag or Last-Modified are stored; later requests for the same URL send If-None-Match /
+# If-Modified-Since, and a 304 is answered with the stored body. APIs such as GitHub do not count 304s against the rate limit.
+class HttpCache:
+    def __init__(self, path, max_bytes=HTTP_CACHE_MAX_BYTES, name='http'):
+        self.path = path
+        self.name = name
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # WAL and a busy timeout let the CloudScrap worker processes share the file
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, headers TEXT, body BLOB,"
+            " size INTEGER, accessed REAL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self.connection.commit()
+        self.total_bytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, url):
+        with self.lock:
+            return self.connection.execute(
+                "SELECT etag, last_modified, headers, body FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+
+    def _store(self, url, response):
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        body = response.content
+        headers = json.dumps({name: response.headers[name] for name in CACHED_HEADERS if name in response.headers})
+        with self.lock:
+            previous = self.connection.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses (url, etag, last_modified, headers, body, size, accessed)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, headers, body, len(body), time.time())
+            )
+            self.total_bytes += len(body) - (previous[0] if previous else 0)
+            self._evict()
+            self.connection.commit()
+
+    def _touch(self, url):
+        with self.lock:
+            self.connection.execute("UPDATE responses SET accessed = ? WHERE url = ?", (time.time(), url))
+            self.connection.commit()
+
+    # Function to drop least recently used entries until the cache is back under 90% of its size bound
+    def _evict(self):
+        if self.total_bytes <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        evicted = 0
+        rows = self.connection.execute("SELECT url, size FROM responses ORDER BY accessed").fetchall()
+        for url, size in rows:
+            if self.total_bytes <= target:
+                break
+            self.connection.execute("DELETE FROM responses WHERE url = ?", (url,))
+            self.total_bytes -= size
+            evicted += 1
+        logger.info(f"Evicted {evicted} entries from HTTP cache {self.path}")
+
+    # Function to GET a URL through the cache. Returns a requests.Response; a revalidated entry comes back
+    # as a 200 with the stored body and the headers of the 304 (so rate-limit headers stay current).
+    def get(self, url, headers=None, **kwargs):
+        cached = self._lookup(url)
+        request_headers = dict(headers or {})
+        if cached is not None:
+            etag, last_modified, _, _ = cached
+            if etag:
+                request_headers['If-None-Match'] = etag
+            if last_modified:
+                request_headers['If-Modified-Since'] = last_modified
+
+        response = get_session().get(url, headers=request_headers, **kwargs)
+
+        if response.status_code == 304 and cached is not None:
+            self.hits += 1
+            record_cache(self.name, True)
+            self._touch(url)
+            return self._from_cache(response, cached)
+
+        self.misses += 1
+        record_cache(self.name, False)
+        if response.status_code == 200 and ('ETag' in response.headers or 'Last-Modified' in response.headers):
+            self._store(url, response)
+        return response
+
+    def _from_cache(self, not_modified, cached):
+        _, _, headers, body = cached
+        response = Response()
+        response.status_code = 200
+        response.url = not_modified.url
+        response.request = not_modified.request
+        response.headers = CaseInsensitiveDict(json.loads(headers))
+        response.headers.update(not_modified.headers)
+        response._content = bytes(body)
+        response.encoding = not_modified.encoding or 'utf-8'
+        response.from_cache = True
+        return response
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+# Function to get the process-wide cache for a file, opening it on first use
+def get_cache(path, max_bytes=HTTP_CACHE_MAX_BYTES, name='http'):
+    with _caches_lock:
+        if path not in _caches:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            _caches[path] = HttpCache(path, max_bytes, name)
+        return _caches[path]
@@ -0,0 +1,76 @@
+import time
+import threading
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+from rate_limiter import RateScheduler
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Number of per-host connection pools kept alive (Airtable, SendGrid, Sheets, GitHub, ...)
+POOL_CONNECTIONS = 10
+# Maximum number of idle keep-alive connections kept per host
+POOL_MAXSIZE = 20
+# How many times a request is re-sent after a 429 before the response is handed back to the caller
+MAX_RATE_LIMIT_RETRIES = 5
+
+# Session that waits for a per-base / per-endpoint token before every request and re-sends after a 429.
+# Every attempt is recorded in the metrics registry.
+class RateLimitedSession(requests.Session):
+    def __init__(self, scheduler=None, max_rate_limit_retries=MAX_RATE_LIMIT_RETRIES):
+        super().__init__()
+        self.scheduler = scheduler or RateScheduler()
+        self.max_rate_limit_retries = max_rate_limit_retries
+
+    def request(self, method, url, *args, **kwargs):
+        attempt = 0
+        while True:
+            bucket = self.scheduler.acquire(url)
+            started = time.perf_counter()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except Exception as e:
+                metrics.record_error(method, url, e, time.perf_counter() - started)
+                raise
+            metrics.record_response(method, url, response, time.perf_counter() - started, streamed=kwargs.get('stream', False))
+            retry_after = self.scheduler.record(bucket, response)
+            if retry_after is None or bucket is None or attempt >= self.max_rate_limit_retries:
+                return response
+            attempt += 1
+            metrics.record_retry(url)
+            logger.info(f"Retrying {method} {url} after 429 (attempt {attempt}/{self.max_rate_limit_retries})")
+
+# Define the retry session function
+def requests_retry_session(retries=3, backoff_factor=0.3, status_forcelist=(500, 502, 504), session=None,
+                           pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE):
+    session = session or requests.Session()
+    retry = Retry(
+        total=retries,
+        read=retries,
+        connect=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=status_forcelist,
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+_session = None
+_session_lock = threading.Lock()
+
+# Function to get the process-wide pooled session shared by every sync script
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests_retry_session(session=RateLimitedSession())
+                session.headers.update({
+                    "Accept-Encoding": "gzip, deflate",
+                    "Connection": "keep-alive",
+                })
+                _session = session
+    return _session
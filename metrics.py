@@ -0,0 +1,340 @@
+import os
+import re
+import json
+import time
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from rate_limiter import get_sendgrid_endpoint
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket catches everything slower
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float('inf'))
+# File the JSON run summary is written to at exit, if set; the summary is always logged
+SYNC_METRICS_PATH = os.getenv('SYNC_METRICS_PATH')
+
+# Latency histogram with fixed buckets
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    # Function to estimate a quantile from the bucket bounds
+    def quantile(self, q):
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound if bound != float('inf') else self.buckets[-2]
+        return self.buckets[-2]
+
+# Counters and latency histogram of one endpoint (of one base)
+class EndpointStats:
+    def __init__(self):
+        self.calls = {}            # (method, status) -> count
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency = Histogram()
+
+# Collects call counts, status codes, retries, bytes and latency per service / endpoint / base
+class MetricsRegistry:
+    def __init__(self):
+        self.stats = {}
+        self.caches = {}           # cache name -> [hits, misses]
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def _get(self, key):
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = EndpointStats()
+        return stats
+
+    # Function to record one finished call
+    def record_call(self, service, endpoint, base, method, status, elapsed, bytes_sent=0, bytes_received=0):
+        with self.lock:
+            stats = self._get((service, endpoint, base))
+            stats.calls[(method, status)] = stats.calls.get((method, status), 0) + 1
+            stats.bytes_sent += bytes_sent
+            stats.bytes_received += bytes_received
+            stats.latency.observe(elapsed)
+
+    # Function to record that a call was sent again (after a 429 or a retried 5xx)
+    def record_retry(self, service, endpoint, base, count=1):
+        with self.lock:
+            self._get((service, endpoint, base)).retries += count
+
+    # Function to record one cache lookup
+    def record_cache(self, name, hit):
+        with self.lock:
+            counts = self.caches.setdefault(name, [0, 0])
+            counts[0 if hit else 1] += 1
+
+    # Function to copy everything recorded so far, e.g. to later report only what happened after this point
+    def copy(self):
+        copied = MetricsRegistry()
+        with self.lock:
+            copied.started = self.started
+            copied.caches = {name: list(counts) for name, counts in self.caches.items()}
+            for key, stats in self.stats.items():
+                copy_stats = copied.stats[key] = EndpointStats()
+                copy_stats.calls = dict(stats.calls)
+                copy_stats.retries = stats.retries
+                copy_stats.bytes_sent = stats.bytes_sent
+                copy_stats.bytes_received = stats.bytes_received
+                copy_stats.latency.counts = list(stats.latency.counts)
+                copy_stats.latency.count = stats.latency.count
+                copy_stats.latency.sum = stats.latency.sum
+        return copied
+
+    # Function to add everything recorded in another registry, e.g. one sent back by a worker process
+    def merge(self, other):
+        other = other.copy()
+        with self.lock:
+            for name, (hits, misses) in other.caches.items():
+                counts = self.caches.setdefault(name, [0, 0])
+                counts[0] += hits
+                counts[1] += misses
+            for key, other_stats in other.stats.items():
+                stats = self._get(key)
+                for call, count in other_stats.calls.items():
+                    stats.calls[call] = stats.calls.get(call, 0) + count
+                stats.retries += other_stats.retries
+                stats.bytes_sent += other_stats.bytes_sent
+                stats.bytes_received += other_stats.bytes_received
+                stats.latency.counts = [mine + theirs for mine, theirs in zip(stats.latency.counts, other_stats.latency.counts)]
+                stats.latency.count += other_stats.latency.count
+                stats.latency.sum += other_stats.latency.sum
+
+    # The lock is left out so a registry can be sent to another process
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    # Function to get a new registry with what was recorded since an earlier copy() of this one
+    def since(self, earlier):
+        current = self.copy()
+        delta = MetricsRegistry()
+        delta.caches = {
+            name: [hits - earlier.caches.get(name, [0, 0])[0], misses - earlier.caches.get(name, [0, 0])[1]]
+            for name, (hits, misses) in current.caches.items()
+        }
+        delta.caches = {name: counts for name, counts in delta.caches.items() if any(counts)}
+        for key, stats in current.stats.items():
+            before = earlier.stats.get(key, EndpointStats())
+            if stats.latency.count == before.latency.count and stats.retries == before.retries:
+                continue
+            delta_stats = delta.stats[key] = EndpointStats()
+            delta_stats.calls = {call: count - before.calls.get(call, 0) for call, count in stats.calls.items()
+                                 if count != before.calls.get(call, 0)}
+            delta_stats.retries = stats.retries - before.retries
+            delta_stats.bytes_sent = stats.bytes_sent - before.bytes_sent
+            delta_stats.bytes_received = stats.bytes_received - before.bytes_received
+            delta_stats.latency.counts = [now - then for now, then in zip(stats.latency.counts, before.latency.counts)]
+            delta_stats.latency.count = stats.latency.count - before.latency.count
+            delta_stats.latency.sum = stats.latency.sum - before.latency.sum
+        return delta
+
+    # Function to get a JSON-serializable summary of everything recorded so far
+    def summary(self):
+        with self.lock:
+            endpoints = []
+            for (service, endpoint, base), stats in sorted(self.stats.items(), key=lambda item: tuple(map(str, item[0]))):
+                status_codes = {}
+                methods = {}
+                for (method, status), count in stats.calls.items():
+                    status_codes[str(status)] = status_codes.get(str(status), 0) + count
+                    methods[method] = methods.get(method, 0) + count
+                endpoints.append({
+                    'service': service,
+                    'endpoint': endpoint,
+                    'base': base,
+                    'calls': stats.latency.count,
+                    'methods': methods,
+                    'status_codes': status_codes,
+                    'retries': stats.retries,
+                    'bytes_sent': stats.bytes_sent,
+                    'bytes_received': stats.bytes_received,
+                    'latency_total': round(stats.latency.sum, 3),
+                    'latency_p50': stats.latency.quantile(0.5),
+                    'latency_p95': stats.latency.quantile(0.95),
+                })
+            return {
+                'started': self.started,
+                'duration': round(time.time() - self.started, 3),
+                'calls': sum(endpoint['calls'] for endpoint in endpoints),
+                'endpoints': endpoints,
+                'caches': {
+                    name: {'hits': hits, 'misses': misses, 'hit_ratio': round(hits / (hits + misses), 3)}
+                    for name, (hits, misses) in sorted(self.caches.items())
+                },
+            }
+
+    # Function to render everything recorded so far in the Prometheus text exposition format
+    def render_prometheus(self):
+        lines = [
+            '# HELP sync_api_calls_total Outbound API calls by endpoint, method and status.',
+            '# TYPE sync_api_calls_total counter',
+        ]
+        with self.lock:
+            items = sorted(self.stats.items(), key=lambda item: tuple(map(str, item[0])))
+            for key, stats in items:
+                for (method, status), count in sorted(stats.calls.items(), key=lambda item: tuple(map(str, item[0]))):
+                    lines.append(f'sync_api_calls_total{{{_labels(key, method=method, status=status)}}} {count}')
+
+            lines += ['# HELP sync_api_retries_total Outbound API calls that were sent again.',
+                      '# TYPE sync_api_retries_total counter']
+            lines += [f'sync_api_retries_total{{{_labels(key)}}} {stats.retries}' for key, stats in items]
+
+            lines += ['# HELP sync_api_sent_bytes_total Request body bytes sent.',
+                      '# TYPE sync_api_sent_bytes_total counter']
+            lines += [f'sync_api_sent_bytes_total{{{_labels(key)}}} {stats.bytes_sent}' for key, stats in items]
+
+            lines += ['# HELP sync_api_received_bytes_total Response body bytes received.',
+                      '# TYPE sync_api_received_bytes_total counter']
+            lines += [f'sync_api_received_bytes_total{{{_labels(key)}}} {stats.bytes_received}' for key, stats in items]
+
+            lines += ['# HELP sync_api_call_duration_seconds Outbound API call latency.',
+                      '# TYPE sync_api_call_duration_seconds histogram']
+            for key, stats in items:
+                cumulative = 0
+                for bound, count in zip(stats.latency.buckets, stats.latency.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'sync_api_call_duration_seconds_bucket{{{_labels(key, le=le)}}} {cumulative}')
+                lines.append(f'sync_api_call_duration_seconds_sum{{{_labels(key)}}} {stats.latency.sum:.6f}')
+                lines.append(f'sync_api_call_duration_seconds_count{{{_labels(key)}}} {stats.latency.count}')
+
+            lines += ['# HELP sync_cache_lookups_total Cache lookups by cache and result.',
+                      '# TYPE sync_cache_lookups_total counter']
+            for name, (hits, misses) in sorted(self.caches.items()):
+                lines.append(f'sync_cache_lookups_total{{cache="{_escape(name)}",result="hit"}} {hits}')
+                lines.append(f'sync_cache_lookups_total{{cache="{_escape(name)}",result="miss"}} {misses}')
+        return '\n'.join(lines) + '\n'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(key, **extra):
+    service, endpoint, base = key
+    labels = {'service': service, 'endpoint': endpoint, 'base': base or '', **extra}
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+
+# Function to map a URL to (service, endpoint template, base) so ids and emails do not explode the label space
+def describe_url(url):
+    parts = urlsplit(url)
+    host = parts.hostname or ''
+    segments = [segment for segment in parts.path.split('/') if segment]
+    if host == 'api.airtable.com':
+        base = segments[1] if len(segments) > 1 else None
+        table = segments[2] if len(segments) > 2 else ''
+        endpoint = f"/v0/{{base}}/{table}" + ('/{record}' if len(segments) > 3 else '')
+        return 'airtable', endpoint, base
+    if host == 'api.sendgrid.com':
+        return 'sendgrid', get_sendgrid_endpoint(parts.path), None
+    if host == 'api.github.com':
+        if segments[:1] == ['users']:
+            return 'github', '/users/{user}' + ''.join(f'/{segment}' for segment in segments[2:]), None
+        return 'github', parts.path or '/', None
+    if host == 'raw.githubusercontent.com':
+        return 'github', '/{user}/{repo}/' + '/'.join(segments[2:]), None
+    if host == 'github.com':
+        return 'github', '/{user}' if len(segments) <= 1 else '/{user}/' + '/'.join(segments[1:]), None
+    return host or 'unknown', re.sub(r'/\d+', '/{id}', parts.path) or '/', None
+
+# Function to get the size of a request or response body without reading a streamed body
+def _body_size(body, headers=None):
+    if body is None:
+        length = (headers or {}).get('Content-Length')
+        return int(length) if length and length.isdigit() else 0
+    return len(body)
+
+_registry = None
+_registry_lock = threading.Lock()
+
+# Function to get the process-wide metrics registry; the JSON summary is emitted at exit once it exists
+def get_metrics():
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = MetricsRegistry()
+                atexit.register(emit_summary)
+    return _registry
+
+# Function to record a finished HTTP request from its requests.Response
+def record_response(method, url, response, elapsed, streamed=False):
+    service, endpoint, base = describe_url(url)
+    request = response.request
+    body = getattr(request, 'body', None)
+    received = _body_size(None if streamed else response.content, response.headers)
+    get_metrics().record_call(service, endpoint, base, method.upper(), response.status_code, elapsed,
+                              _body_size(body), received)
+    # Retries done inside urllib3 (5xx, connection errors) are only visible on the raw response
+    history = getattr(getattr(response.raw, 'retries', None), 'history', None)
+    if history:
+        get_metrics().record_retry(service, endpoint, base, len(history))
+
+# Function to record an HTTP request that raised before a response came back
+def record_error(method, url, error, elapsed):
+    service, endpoint, base = describe_url(url)
+    get_metrics().record_call(service, endpoint, base, method.upper(), type(error).__name__, elapsed)
+
+# Function to record that a request is being sent again
+def record_retry(url):
+    get_metrics().record_retry(*describe_url(url))
+
+# Function to record a cache hit or miss under the cache's name
+def record_cache(name, hit):
+    get_metrics().record_cache(name, hit)
+
+# Context manager timing a non-HTTP call such as a gspread method
+@contextmanager
+def time_call(service, endpoint, base=None):
+    started = time.perf_counter()
+    status = 'ok'
+    try:
+        yield
+    except Exception as e:
+        status = type(e).__name__
+        raise
+    finally:
+        get_metrics().record_call(service, endpoint, base, 'CALL', status, time.perf_counter() - started)
+
+# Function to log a summary (by default the whole run's) and write it to SYNC_METRICS_PATH if set.
+# A job name is added to the file name, so the daemon writes one summary file per job.
+def emit_summary(summary=None, job=None):
+    summary = summary if summary is not None else get_metrics().summary()
+    if not summary['calls'] and not summary['caches']:
+        return
+    logger.info(f"{'Job ' + job if job else 'Run'} metrics: {json.dumps(summary)}")
+    if SYNC_METRICS_PATH:
+        root, extension = os.path.splitext(SYNC_METRICS_PATH)
+        path = f"{root}.{job}{extension}" if job else SYNC_METRICS_PATH
+        try:
+            with open(path, 'w') as metrics_file:
+                json.dump(summary, metrics_file, indent=2)
+        except OSError as e:
+            logger.warning(f"Failed to write metrics summary to {path}: {e}")
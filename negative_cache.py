@@ -0,0 +1,70 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+# Persistent set of keys that produced nothing last time they were looked up, each valid for a TTL.
+# Lets a scraper skip an expensive fallback chain for keys known to come up empty, until the entry expires.
+class NegativeCache:
+    def __init__(self, path, ttl, name='negative'):
+        self.path = path
+        self.ttl = ttl
+        self.name = name
+        self.lock = threading.Lock()
+        # WAL and a busy timeout let the CloudScrap worker processes share the file
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS misses (key TEXT PRIMARY KEY, expires REAL)")
+        self.connection.execute("DELETE FROM misses WHERE expires <= ?", (time.time(),))
+        self.connection.commit()
+        self.hits = 0
+        self.misses = 0
+
+    # Function to check whether a key is a known miss; every call counts towards the hit ratio
+    def contains(self, key):
+        with self.lock:
+            row = self.connection.execute("SELECT expires FROM misses WHERE key = ?", (str(key),)).fetchone()
+            hit = row is not None and row[0] > time.time()
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        record_cache(self.name, hit)
+        return hit
+
+    # Function to remember that a key produced nothing
+    def add(self, key):
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO misses (key, expires) VALUES (?, ?)", (str(key), time.time() + self.ttl)
+            )
+            self.connection.commit()
+
+    # Function to forget a key, e.g. once it did produce a result
+    def discard(self, key):
+        with self.lock:
+            self.connection.execute("DELETE FROM misses WHERE key = ?", (str(key),))
+            self.connection.commit()
+
+    def hit_ratio(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+# Function to get the process-wide negative cache for a file, opening it on first use
+def get_negative_cache(path, ttl, name='negative'):
+    with _caches_lock:
+        if path not in _caches:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            _caches[path] = NegativeCache(path, ttl, name)
+        return _caches[path]
@@ -0,0 +1,142 @@
+import re
+import time
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Airtable allows 5 requests per second per base
+AIRTABLE_REQUESTS_PER_SECOND = 5.0
+# SendGrid limits are per endpoint; 10 req/s stays under the v3 limits the scripts hit
+SENDGRID_REQUESTS_PER_SECOND = 10.0
+# Back-off used when a 429 comes without a usable Retry-After / X-RateLimit-Reset header
+DEFAULT_RETRY_AFTER = 30.0
+
+# Token bucket whose refill rate adapts with AIMD: additive increase on success, multiplicative decrease on 429
+class TokenBucket:
+    def __init__(self, rate, capacity=None, min_rate=None, increase=0.1, decrease=0.5):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate or rate / 10
+        self.capacity = capacity or rate
+        self.increase = increase
+        self.decrease = decrease
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Block until a request may be sent
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def on_success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttled(self, retry_after):
+        with self.lock:
+            now = time.monotonic()
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.tokens = 0
+            self.updated = now
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+
+# Function to read how long to wait from a 429 response's Retry-After or X-RateLimit-Reset header
+def get_retry_after(response, default=DEFAULT_RETRY_AFTER):
+    retry_after = response.headers.get('Retry-After')
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    reset = response.headers.get('X-RateLimit-Reset')
+    if reset:
+        try:
+            return max(0.0, float(reset) - time.time())
+        except ValueError:
+            pass
+
+    return default
+
+# Function to turn a SendGrid path into an endpoint template, e.g. /v3/asm/groups/{id}/suppressions/{email}
+def get_sendgrid_endpoint(path):
+    segments = []
+    for segment in path.strip('/').split('/'):
+        if '@' in segment or '%40' in segment:
+            segments.append('{email}')
+        elif re.fullmatch(r'[0-9a-f-]{8,}|\d+', segment):
+            segments.append('{id}')
+        else:
+            segments.append(segment)
+    return '/' + '/'.join(segments)
+
+# Keeps one token bucket per Airtable base and per SendGrid endpoint
+class RateScheduler:
+    def __init__(self, airtable_rate=AIRTABLE_REQUESTS_PER_SECOND, sendgrid_rate=SENDGRID_REQUESTS_PER_SECOND):
+        self.airtable_rate = airtable_rate
+        self.sendgrid_rate = sendgrid_rate
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    # Function to map a URL to its rate-limit key, or None for hosts that are not limited here
+    def get_key(self, url):
+        parts = urlsplit(url)
+        if parts.hostname == 'api.airtable.com':
+            segments = parts.path.strip('/').split('/')
+            if len(segments) >= 2:
+                return ('airtable', segments[1])
+        elif parts.hostname == 'api.sendgrid.com':
+            return ('sendgrid', get_sendgrid_endpoint(parts.path))
+        return None
+
+    def get_bucket(self, url):
+        key = self.get_key(url)
+        if key is None:
+            return None
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                rate = self.airtable_rate if key[0] == 'airtable' else self.sendgrid_rate
+                bucket = self.buckets[key] = TokenBucket(rate)
+            return bucket
+
+    # Function to wait for a slot for the given URL
+    def acquire(self, url):
+        bucket = self.get_bucket(url)
+        if bucket is not None:
+            bucket.acquire()
+        return bucket
+
+    # Function to feed a response back into the bucket; returns the wait in seconds if it was a 429
+    def record(self, bucket, response):
+        if bucket is None:
+            return None
+        if response.status_code == 429:
+            retry_after = get_retry_after(response)
+            bucket.on_throttled(retry_after)
+            logger.warning(f"Rate limited on {response.url}, backing off {retry_after:.1f}s (rate now {bucket.rate:.2f} req/s)")
+            return retry_after
+        bucket.on_success()
+        return None
@@ -0,0 +1,108 @@
+import heapq
+import itertools
+import tempfile
+from collections import namedtuple
+
+ADDED = 'added'        # in the left stream only
+REMOVED = 'removed'    # in the right stream only
+COMMON = 'common'      # in both streams
+
+# Above this many distinct emails the inputs are sorted on disk and merged instead of hashed in memory
+MAX_IN_MEMORY = 500000
+
+Reconciliation = namedtuple('Reconciliation', [ADDED, REMOVED, COMMON])
+
+# Function to lazily reconcile a stream against an in-memory set, yielding (status, email) pairs.
+# Left emails are yielded as they arrive, so callers can act on them before the left stream ends.
+def iter_reconcile(left, right, include_removed=True):
+    right_set = right if isinstance(right, (set, frozenset)) else set(right)
+    seen = set()
+    for email in left:
+        if email in seen:
+            continue
+        seen.add(email)
+        yield (COMMON if email in right_set else ADDED), email
+
+    if include_removed:
+        for email in right_set:
+            if email not in seen:
+                yield REMOVED, email
+
+# Function to reconcile two sorted streams with a single merge pass, yielding (status, email) pairs
+def iter_reconcile_sorted(left_sorted, right_sorted):
+    missing = object()
+    left_iter = _unique(left_sorted)
+    right_iter = _unique(right_sorted)
+    left = next(left_iter, missing)
+    right = next(right_iter, missing)
+
+    while left is not missing and right is not missing:
+        if left == right:
+            yield COMMON, left
+            left = next(left_iter, missing)
+            right = next(right_iter, missing)
+        elif left < right:
+            yield ADDED, left
+            left = next(left_iter, missing)
+        else:
+            yield REMOVED, right
+            right = next(right_iter, missing)
+
+    while left is not missing:
+        yield ADDED, left
+        left = next(left_iter, missing)
+    while right is not missing:
+        yield REMOVED, right
+        right = next(right_iter, missing)
+
+# Function to drop consecutive duplicates from a sorted stream
+def _unique(sorted_items):
+    previous = object()
+    for item in sorted_items:
+        if item != previous:
+            yield item
+            previous = item
+
+# Function to sort a stream that may not fit in memory: sorted runs are spilled to temp files and merged lazily
+def external_sort(items, run_size=MAX_IN_MEMORY):
+    run_files = []
+    try:
+        items = iter(items)
+        while True:
+            run = sorted(itertools.islice(items, run_size))
+            if not run:
+                break
+            run_file = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+            run_file.writelines(f"{item}\n" for item in run)
+            run_file.seek(0)
+            run_files.append(run_file)
+
+        runs = [(line.rstrip('\n') for line in run_file) for run_file in run_files]
+        yield from heapq.merge(*runs)
+    finally:
+        for run_file in run_files:
+            run_file.close()
+
+# Function to lazily reconcile two streams of emails, yielding (status, email) pairs.
+# Hashed sets are used when the right stream fits in memory, otherwise both streams are sorted on disk and merged,
+# so inputs too large for RAM should be consumed through this generator rather than reconcile().
+def iter_reconcile_streams(left, right, max_in_memory=MAX_IN_MEMORY, include_removed=True):
+    right = iter(right)
+    head = list(itertools.islice(right, max_in_memory + 1))
+
+    if len(head) <= max_in_memory:
+        yield from iter_reconcile(left, head, include_removed)
+    else:
+        for status, email in iter_reconcile_sorted(
+            external_sort(left, max_in_memory),
+            external_sort(itertools.chain(head, right), max_in_memory),
+        ):
+            if include_removed or status != REMOVED:
+                yield status, email
+
+# Function to reconcile two streams of emails into added/removed/common lists
+def reconcile(left, right, max_in_memory=MAX_IN_MEMORY):
+    result = Reconciliation([], [], [])
+    for status, email in iter_reconcile_streams(left, right, max_in_memory):
+        getattr(result, status).append(email)
+    return result
@@ -0,0 +1,208 @@
+import csv
+import gzip
+import io
+import json
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from http_client import get_session
+
+logger = logging.getLogger(__name__)
+
+SENDGRID_API_URL = "https://api.sendgrid.com/v3"
+# SendGrid accepts at most 30,000 contacts or 6 MB per PUT /marketing/contacts request
+MAX_CONTACTS_PER_REQUEST = 30000
+MAX_PAYLOAD_BYTES = 5 * 1024 * 1024
+# From this many contacts on, a single gzipped CSV import replaces the JSON requests
+CSV_IMPORT_THRESHOLD = 200000
+# Number of chunks sent to SendGrid at the same time
+UPSERT_WORKERS = 4
+JOB_POLL_INTERVAL = 5
+JOB_POLL_TIMEOUT = 900
+
+# Per-email outcomes
+COMPLETED = 'completed'   # the import job finished and did not report the email as an error
+ERRORED = 'errored'       # the import job reported the email in its errors file
+FAILED = 'failed'         # the request was rejected or the import job failed as a whole
+PENDING = 'pending'       # the import job had not finished when polling gave up
+
+def get_headers(api_key):
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+
+# Function to split a (possibly lazy) stream of emails into chunks bounded by contact count and payload size
+def chunk_contacts(emails, max_count=MAX_CONTACTS_PER_REQUEST, max_bytes=MAX_PAYLOAD_BYTES):
+    chunk = []
+    size = len('{"contacts":[]}')
+    for email in emails:
+        contact_size = len(json.dumps({"email": email})) + 1
+        if chunk and (len(chunk) >= max_count or size + contact_size > max_bytes):
+            yield chunk
+            chunk = []
+            size = len('{"contacts":[]}')
+        chunk.append(email)
+        size += contact_size
+    if chunk:
+        yield chunk
+
+# Function to send one chunk and return the id of the import job SendGrid queued for it
+def put_contacts(emails, api_key):
+    url = f"{SENDGRID_API_URL}/marketing/contacts"
+    data = {
+        "contacts": [{"email": email} for email in emails]
+    }
+    response = get_session().put(url, headers=get_headers(api_key), json=data)
+
+    if response.status_code == 202:
+        return response.json().get('job_id')
+    else:
+        raise Exception(f"Failed to upsert contacts to SendGrid: {response.status_code} - {response.text}")
+
+# Function to get the id of the reserved 'email' field, needed to map the CSV column
+def get_email_field_id(api_key):
+    url = f"{SENDGRID_API_URL}/marketing/field_definitions"
+    response = get_session().get(url, headers=get_headers(api_key))
+
+    if response.status_code == 200:
+        for field in response.json().get('reserved_fields', []):
+            if field.get('name') == 'email':
+                return field['id']
+        raise Exception("SendGrid did not return a reserved 'email' field definition")
+    else:
+        raise Exception(f"Failed to get SendGrid field definitions: {response.status_code} - {response.text}")
+
+# Function to upload all emails as one gzipped CSV import and return its job id
+def import_contacts_csv(emails, api_key):
+    url = f"{SENDGRID_API_URL}/marketing/contacts/imports"
+    data = {
+        "file_type": "csv",
+        "field_mappings": [get_email_field_id(api_key)],
+        "is_compressed": True
+    }
+    response = get_session().put(url, headers=get_headers(api_key), json=data)
+    if response.status_code != 200:
+        raise Exception(f"Failed to start SendGrid contact import: {response.status_code} - {response.text}")
+    job = response.json()
+
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb') as gz:
+        text = io.TextIOWrapper(gz, encoding='utf-8', newline='')
+        writer = csv.writer(text)
+        writer.writerow(['email'])
+        writer.writerows([email] for email in emails)
+        text.flush()
+        text.detach()
+
+    upload_headers = {header['header']: header['value'] for header in job.get('upload_headers', [])}
+    response = get_session().put(job['upload_uri'], headers=upload_headers, data=buffer.getvalue())
+    if response.status_code not in (200, 201, 204):
+        raise Exception(f"Failed to upload SendGrid contact import file: {response.status_code} - {response.text}")
+
+    return job['job_id']
+
+# Function to poll an import job until it completes, fails or the timeout passes
+def wait_for_job(job_id, api_key, poll_interval=JOB_POLL_INTERVAL, timeout=JOB_POLL_TIMEOUT):
+    url = f"{SENDGRID_API_URL}/marketing/contacts/imports/{job_id}"
+    deadline = time.monotonic() + timeout
+    while True:
+        response = get_session().get(url, headers=get_headers(api_key))
+        if response.status_code == 200:
+            job = response.json()
+            if job.get('status') in ('completed', 'errored', 'failed'):
+                return job
+        else:
+            logger.warning(f"Failed to poll SendGrid job {job_id}: {response.status_code} - {response.text}")
+
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(poll_interval)
+
+# Function to read the emails listed in a job's errors file
+def get_errored_emails(job, emails):
+    errors_url = (job.get('results') or {}).get('errors_url')
+    if not errors_url:
+        return set()
+    response = get_session().get(errors_url)
+    if response.status_code != 200:
+        logger.warning(f"Failed to download SendGrid errors file for job {job.get('id')}: {response.status_code}")
+        # We know some contacts failed but not which ones
+        return set(emails)
+    candidates = set(emails)
+    errored = set()
+    for row in csv.reader(io.StringIO(response.text)):
+        errored.update(cell.strip().lower() for cell in row if cell.strip().lower() in candidates)
+    return errored
+
+# Function to send one chunk and resolve the outcome of every email in it
+def upsert_chunk(emails, api_key, wait=True, use_csv=False):
+    try:
+        job_id = import_contacts_csv(emails, api_key) if use_csv else put_contacts(emails, api_key)
+    except Exception as e:
+        logger.error(str(e))
+        return {email: FAILED for email in emails}
+
+    logger.info(f"SendGrid accepted {len(emails)} contacts as job {job_id}")
+    if not wait:
+        return {email: PENDING for email in emails}
+
+    job = wait_for_job(job_id, api_key)
+    if job is None:
+        logger.warning(f"SendGrid job {job_id} did not finish in time")
+        return {email: PENDING for email in emails}
+    if job.get('status') == 'failed':
+        logger.error(f"SendGrid job {job_id} failed")
+        return {email: FAILED for email in emails}
+
+    errored = get_errored_emails(job, emails)
+    if errored:
+        logger.warning(f"SendGrid job {job_id} reported {len(errored)} errored contacts")
+    return {email: (ERRORED if email in errored else COMPLETED) for email in emails}
+
+# Function to upsert contacts in size- and count-bounded chunks sent concurrently.
+# Chunks are dispatched while the input stream is still being read. Very large collections go through one CSV import:
+# a sized collection is imported whole, and a stream switches to a CSV import for everything after its first
+# CSV_IMPORT_THRESHOLD contacts.
+# Returns a dict of email -> outcome (completed, errored, failed or pending).
+def upsert_contacts(emails, api_key, max_workers=UPSERT_WORKERS, wait=True):
+    if hasattr(emails, '__len__') and len(emails) >= CSV_IMPORT_THRESHOLD:
+        emails = list(dict.fromkeys(emails))
+        logger.info(f"Upserting {len(emails)} contacts through a CSV import")
+        return upsert_chunk(emails, api_key, wait=wait, use_csv=True)
+
+    outcomes = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = []
+        sent = 0
+        chunks = chunk_contacts(unique_emails(emails))
+        for chunk in chunks:
+            futures.append(executor.submit(upsert_chunk, chunk, api_key, wait))
+            sent += len(chunk)
+            if sent >= CSV_IMPORT_THRESHOLD:
+                break
+
+        # The stream turned out to be large: the rest goes out as a single CSV import
+        remaining = [email for chunk in chunks for email in chunk]
+        if remaining:
+            logger.info(f"Upserting {len(remaining)} more contacts through a CSV import after {sent} sent as JSON")
+            futures.append(executor.submit(upsert_chunk, remaining, api_key, wait, True))
+
+        for future in futures:
+            outcomes.update(future.result())
+    return outcomes
+
+# Function to drop repeated emails from a stream without materializing it
+def unique_emails(emails):
+    seen = set()
+    for email in emails:
+        if email not in seen:
+            seen.add(email)
+            yield email
+
+# Function to count outcomes for logging
+def summarize_outcomes(outcomes):
+    summary = {}
+    for outcome in outcomes.values():
+        summary[outcome] = summary.get(outcome, 0) + 1
+    return summary
@@ -0,0 +1,71 @@
+import os
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Rows collected before they are written with one append_rows call
+SHEET_FLUSH_EVERY = 50
+
+# Buffers rows for a Google worksheet and writes them with append_rows.
+# Every row is journaled to a local file before it is buffered, and the journal is cleared once the rows are in the sheet.
+# After a crash, recover() appends the journaled rows that did not make it into the sheet, so none are dropped or duplicated.
+class BufferedSheetSink:
+    def __init__(self, worksheet, journal_path, flush_every=SHEET_FLUSH_EVERY):
+        self.worksheet = worksheet
+        self.journal_path = journal_path
+        self.flush_every = flush_every
+        self.buffer = []
+        self.written = 0
+
+    def _read_journal(self):
+        try:
+            with open(self.journal_path) as journal:
+                return [json.loads(line) for line in journal if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def _clear_journal(self):
+        try:
+            os.remove(self.journal_path)
+        except FileNotFoundError:
+            pass
+
+    # Function to append the rows a previous run journaled but never flushed.
+    # 'existing' holds the first-column values already in the sheet; those rows are skipped.
+    def recover(self, existing=()):
+        rows = self._read_journal()
+        if not rows:
+            return []
+        existing = set(existing)
+        missing = [row for row in rows if row and row[0] not in existing]
+        if missing:
+            logger.info(f"Recovering {len(missing)} journaled rows into the sheet")
+            self.worksheet.append_rows(missing)
+        self._clear_journal()
+        return missing
+
+    # Function to queue a row; it is journaled right away and written with the next flush
+    def append(self, row):
+        with open(self.journal_path, 'a') as journal:
+            journal.write(json.dumps(row) + '\n')
+            journal.flush()
+            os.fsync(journal.fileno())
+        self.buffer.append(row)
+        if len(self.buffer) >= self.flush_every:
+            self.flush()
+
+    # Function to write every buffered row in one append_rows call
+    def flush(self):
+        if not self.buffer:
+            return 0
+        rows = list(self.buffer)
+        # The rows are journaled, so a failed write leaves them to the next recover(); keeping them buffered as well
+        # would append them a second time from a long-lived sink
+        self.buffer.clear()
+        self.worksheet.append_rows(rows)
+        self.written += len(rows)
+        # Everything journaled so far is either in the sheet now or was recovered before this run
+        self._clear_journal()
+        logger.info(f"Appended {len(rows)} rows to the sheet")
+        return len(rows)
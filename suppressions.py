@@ -0,0 +1,147 @@
+import time
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from http_client import get_session
+from sync_state import load_state, save_state
+
+logger = logging.getLogger(__name__)
+
+SENDGRID_API_URL = "https://api.sendgrid.com/v3"
+# Number of recipients sent per suppression search request
+SEARCH_BATCH_SIZE = 500
+
+def get_headers(api_key):
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+
+# Function to get every email in an unsubscribe group
+def get_group_suppressions(group_id, api_key):
+    url = f"{SENDGRID_API_URL}/asm/groups/{group_id}/suppressions"
+    response = get_session().get(url, headers=get_headers(api_key))
+
+    if response.status_code == 200:
+        return response.json()
+    else:
+        logger.error(f"Failed to get unsubscribes for group {group_id}: {response.status_code} - {response.text}")
+        raise Exception(f"Failed to get unsubscribes for group {group_id}: {response.status_code} - {response.text}")
+
+# Function to check which of the given emails are in an unsubscribe group, without downloading the whole group
+def search_group_suppressions(group_id, api_key, emails):
+    url = f"{SENDGRID_API_URL}/asm/groups/{group_id}/suppressions/search"
+    emails = list(emails)
+    suppressed = set()
+
+    for start in range(0, len(emails), SEARCH_BATCH_SIZE):
+        payload = {"recipient_emails": emails[start:start + SEARCH_BATCH_SIZE]}
+        response = get_session().post(url, headers=get_headers(api_key), json=payload)
+
+        if response.status_code == 200:
+            suppressed.update(email.lower() for email in response.json())
+        else:
+            logger.error(f"Failed to search unsubscribes for group {group_id}: {response.status_code} - {response.text}")
+            raise Exception(f"Failed to search unsubscribes for group {group_id}: {response.status_code} - {response.text}")
+
+    return suppressed
+
+# Function to checksum a suppression list independently of the order SendGrid returns it in.
+# The per-email digests are summed rather than sorted, so the list is hashed in one pass.
+def get_checksum(emails):
+    total = 0
+    count = 0
+    for email in set(emails):
+        total = (total + int.from_bytes(hashlib.sha256(email.encode('utf-8')).digest(), 'big')) % (1 << 256)
+        count += 1
+    return f"{count}:{total:064x}"
+
+# Remembers, per unsubscribe group, the checksum of the last fully synced list.
+# Only the checksum is persisted, so the state stays the same size however large the group grows.
+class SuppressionCursor:
+    def __init__(self, group_id):
+        self.key = f"sendgrid_suppressions_{group_id}"
+        state = load_state(self.key, {})
+        self.checksum = state.get('checksum')
+        self.current_checksum = None
+        self.pending = set()
+
+    # Function to get the suppressions that need syncing: none when the list is unchanged since the last synced run
+    def diff(self, emails):
+        self.current_checksum = get_checksum(emails)
+        if self.current_checksum == self.checksum:
+            self.pending = set()
+            return []
+        new_emails = list(dict.fromkeys(emails))
+        self.pending = set(new_emails)
+        return new_emails
+
+    # Function to record emails that no longer need syncing
+    def mark_synced(self, emails):
+        for email in emails:
+            self.pending.discard(email)
+
+    # Function to persist the cursor; the checksum only advances once nothing from this list is left pending
+    def commit(self):
+        state = {
+            'checksum': self.current_checksum if not self.pending else None
+        }
+        save_state(self.key, state)
+        logger.info(f"Saved suppression cursor {self.key}: {len(self.pending)} pending")
+
+# Function to fetch only the suppressions that appeared since the last synced run.
+# Returns the new (normalized) emails and the cursor to commit once they have been handled.
+def fetch_new_suppressions(group_id, api_key, normalize=None):
+    emails = get_group_suppressions(group_id, api_key)
+    if normalize is not None:
+        emails = [normalize(email) for email in emails]
+
+    cursor = SuppressionCursor(group_id)
+    new_emails = cursor.diff(emails)
+    logger.info(f"Group {group_id}: {len(emails)} suppressions, {len(new_emails)} to sync")
+    return new_emails, cursor
+
+# Number of DELETE requests sent to SendGrid at the same time when removing suppressions
+REMOVE_WORKERS = 8
+# Extra rounds in which only the failed removals are retried
+REMOVE_RETRY_ROUNDS = 3
+REMOVE_RETRY_BACKOFF = 2.0
+
+# Function to remove one email from an unsubscribe group; returns (success, detail)
+def remove_group_suppression(group_id, api_key, email):
+    url = f"{SENDGRID_API_URL}/asm/groups/{group_id}/suppressions/{email}"
+    try:
+        response = get_session().delete(url, headers=get_headers(api_key))
+    except Exception as e:
+        return False, str(e)
+
+    # 404 means the email is not in the group any more, which is the state we want
+    if response.status_code in (204, 404):
+        return True, response.status_code
+    return False, f"{response.status_code} - {response.text}"
+
+# Function to remove many emails from an unsubscribe group through a bounded worker pool.
+# Every email gets a result; only the failures are retried. Returns a dict of email -> (success, detail).
+def remove_group_suppressions(group_id, api_key, emails, max_workers=REMOVE_WORKERS,
+                              retry_rounds=REMOVE_RETRY_ROUNDS, retry_backoff=REMOVE_RETRY_BACKOFF):
+    results = {}
+    remaining = list(dict.fromkeys(emails))
+
+    for attempt in range(retry_rounds + 1):
+        if not remaining:
+            break
+        if attempt:
+            logger.info(f"Retrying {len(remaining)} failed suppression removals (round {attempt}/{retry_rounds})")
+            time.sleep(retry_backoff * attempt)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            outcomes = list(executor.map(lambda email: remove_group_suppression(group_id, api_key, email), remaining))
+
+        failed = []
+        for email, outcome in zip(remaining, outcomes):
+            results[email] = outcome
+            if not outcome[0]:
+                failed.append(email)
+        remaining = failed
+
+    return results
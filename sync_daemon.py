@@ -0,0 +1,152 @@
+import asyncio
+import argparse
+import importlib
+import logging
+import os
+import signal
+import time
+from metrics import get_metrics, emit_summary
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Every sync job hosted by the daemon: name -> (module, function, interval in seconds).
+# Intervals match the cron schedules of the GitHub workflows and can be overridden with SYNC_INTERVAL_<NAME>.
+JOBS = {
+    'airtable_to_sendgrid': ('Airtable_to_sendgrid', 'main', 10 * 60),
+    'airtable_to_sendgrid_ncg': ('Airtable_to_sendgrid_NCG', 'main', 10 * 60),
+    'airtable_to_sendgrid_newemail': ('Airtable_to_sendgrid_newemail', 'main', 10 * 60),
+    'sendgrid_to_airtable': ('Sendgrid_to_airtable', 'main', 15 * 60),
+    'sendgrid_to_airtable_personalized': ('Sendgrid_to_airtable_personalized', 'main', 15 * 60),
+    'exmailing_unsub': ('ExmailingUnsub', 'main', 60),
+    'standardize': ('Standardize', 'search_and_standardize_emails', 10 * 60),
+    'cloud_scrap': ('CloudScrap', 'main', 2 * 60 * 60),
+}
+# Number of jobs allowed to run at the same time; they share the pooled session and rate limiters either way
+MAX_CONCURRENT_JOBS = int(os.getenv('SYNC_MAX_CONCURRENT_JOBS', '4'))
+# Port of the Prometheus text endpoint (GET /metrics); 0 disables it
+METRICS_PORT = int(os.getenv('SYNC_METRICS_PORT', '9108'))
+# Interface the metrics endpoint listens on; its labels include base IDs and spreadsheet keys, so local only by default
+METRICS_HOST = os.getenv('SYNC_METRICS_HOST', '127.0.0.1')
+
+# Function to get a job's interval, honouring the SYNC_INTERVAL_<NAME> override
+def get_interval(name, default):
+    return float(os.getenv(f"SYNC_INTERVAL_{name.upper()}", default))
+
+# Function to resolve a job's entry point; modules are imported on first use so one broken job cannot stop the others
+def load_job(name):
+    module_name, function_name, _ = JOBS[name]
+    module = importlib.import_module(module_name)
+    return getattr(module, function_name)
+
+# Jobs running right now -> the other jobs that ran at some point while they did
+running_jobs = {}
+
+# Function to run one job in a worker thread, log how it went and emit the metrics recorded while it ran.
+# Calls are recorded process-wide, so the summary also counts calls of the jobs listed in its 'concurrent_jobs'.
+async def run_job(name, semaphore):
+    async with semaphore:
+        started = time.monotonic()
+        started_at = time.time()
+        before = get_metrics().copy()
+        for overlapping in running_jobs.values():
+            overlapping.add(name)
+        concurrent_jobs = running_jobs[name] = set(running_jobs)
+        logger.info(f"Starting job {name}")
+        try:
+            # Importing a module can do network work, so the import also happens off the event loop
+            await asyncio.to_thread(lambda: load_job(name)())
+        except Exception as e:
+            logger.error(f"Job {name} failed: {e}")
+        else:
+            logger.info(f"Job {name} finished in {time.monotonic() - started:.1f}s")
+        finally:
+            running_jobs.pop(name, None)
+            summary = get_metrics().since(before).summary()
+            summary['started'] = started_at
+            summary['duration'] = round(time.monotonic() - started, 3)
+            summary['concurrent_jobs'] = sorted(concurrent_jobs)
+            emit_summary(summary, job=name)
+
+# Function to run one job on its interval; a run that overruns delays the next one instead of overlapping it
+async def schedule_job(name, interval, semaphore, stop_event):
+    next_run = time.monotonic()
+    while not stop_event.is_set():
+        await run_job(name, semaphore)
+        next_run = max(next_run + interval, time.monotonic())
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=next_run - time.monotonic())
+        except asyncio.TimeoutError:
+            pass
+
+# Function to answer one HTTP request on the metrics endpoint
+async def serve_metrics(reader, writer):
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()).strip():
+            pass  # Skip the request headers
+        parts = request_line.decode('latin-1').split()
+        if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+            status, body = '200 OK', get_metrics().render_prometheus()
+        else:
+            status, body = '404 Not Found', 'Not Found\n'
+        payload = body.encode('utf-8')
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode('latin-1') + payload
+        )
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+# Function to run the selected jobs until SIGINT/SIGTERM, or just once each with once=True
+async def run_daemon(job_names, once=False):
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_JOBS)
+
+    if once:
+        await asyncio.gather(*(run_job(name, semaphore) for name in job_names))
+        return
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            pass
+
+    metrics_server = None
+    if METRICS_PORT:
+        metrics_server = await asyncio.start_server(serve_metrics, host=METRICS_HOST, port=METRICS_PORT)
+        logger.info(f"Serving metrics on {METRICS_HOST}:{METRICS_PORT} at /metrics")
+
+    logger.info(f"Sync daemon started with jobs: {', '.join(job_names)}")
+    try:
+        await asyncio.gather(*(
+            schedule_job(name, get_interval(name, JOBS[name][2]), semaphore, stop_event)
+            for name in job_names
+        ))
+    finally:
+        if metrics_server is not None:
+            metrics_server.close()
+            await metrics_server.wait_closed()
+    logger.info("Sync daemon stopped")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run all sync jobs in one long-running process.")
+    parser.add_argument('--jobs', default=','.join(JOBS), help="Comma-separated job names (default: all)")
+    parser.add_argument('--once', action='store_true', help="Run each selected job once and exit")
+    args = parser.parse_args()
+
+    job_names = [name.strip() for name in args.jobs.split(',') if name.strip()]
+    unknown = [name for name in job_names if name not in JOBS]
+    if unknown:
+        parser.error(f"Unknown jobs: {', '.join(unknown)} (known: {', '.join(JOBS)})")
+
+    asyncio.run(run_daemon(job_names, once=args.once))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import os
+import json
+import logging
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Local JSON file that keeps sync cursors between runs
+SYNC_STATE_PATH = os.getenv('SYNC_STATE_PATH', '.sync_state.json')
+
+_lock = threading.Lock()
+
+def _read_all(path):
+    try:
+        with open(path) as state_file:
+            return json.load(state_file)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable sync state {path}: {e}")
+        return {}
+
+# Function to read one entry from the sync state file
+def load_state(key, default=None, path=None):
+    path = path or SYNC_STATE_PATH
+    with _lock:
+        return _read_all(path).get(key, default)
+
+# Function to write one entry to the sync state file; the file is replaced atomically
+def save_state(key, value, path=None):
+    path = path or SYNC_STATE_PATH
+    with _lock:
+        state = _read_all(path)
+        state[key] = value
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.sync_state.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as tmp_file:
+                json.dump(state, tmp_file)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+# Function to parse an Airtable timestamp such as 2024-05-01T12:00:00.000Z
+def parse_timestamp(timestamp):
+    return datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+
+# High-water mark of the last modification time a script has fully processed.
+# Queries start from the stored mark; the first run (or a run without state) falls back to a fixed lookback window.
+class Watermark:
+    def __init__(self, name, default_lookback=timedelta(hours=2)):
+        self.key = f"watermark_{name}"
+        stored = load_state(self.key)
+        self.since = stored or (datetime.utcnow() - default_lookback).isoformat() + 'Z'
+        self.high = None
+
+    # Function to track the newest timestamp seen in this run
+    def observe(self, timestamp):
+        if not timestamp:
+            return
+        if self.high is None or parse_timestamp(timestamp) > parse_timestamp(self.high):
+            self.high = timestamp
+
+    # Function to persist the newest timestamp seen; call only once everything up to it has been processed
+    def commit(self):
+        if self.high and parse_timestamp(self.high) > parse_timestamp(self.since):
+            save_state(self.key, self.high)
+            logger.info(f"Advanced {self.key} to {self.high}")
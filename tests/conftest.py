@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.fake_apis import FakeGitHub, install_fakes
+
+
+# Fake GitHub mounted on the shared session, with CloudScrap's caches in a fresh directory
+@pytest.fixture
+def github(tmp_path, monkeypatch):
+    import CloudScrap
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(CloudScrap, 'GITHUB_CACHE_PATH', str(tmp_path / 'github_cache.sqlite'))
+    monkeypatch.setattr(CloudScrap, 'GITHUB_NEGATIVE_CACHE_PATH', str(tmp_path / 'github_negative_cache.sqlite'))
+    fake = FakeGitHub()
+    fake.transport = install_fakes([fake])
+    return fake
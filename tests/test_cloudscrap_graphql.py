@@ -0,0 +1,74 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_apis import make_response
+from CloudScrap import GitHubGraphQLHandler
+
+
+def lookup(handler, profile_urls):
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        return [future.result() for future in handler.submit_lookups(profile_urls, executor, timeout=10)]
+
+
+def test_fetch_users_maps_aliases_back_to_logins(github):
+    for login in ('alice', 'Bob', 'carol'):
+        github.add_user(login, email=f"{login.lower()}@example.com")
+    handler = GitHubGraphQLHandler(['key'])
+
+    users = handler.fetch_users(['alice', 'Bob', 'carol'])
+
+    assert list(users) == ['alice', 'Bob', 'carol']
+    assert [users[login]['databaseId'] for login in users] == [1, 2, 3]
+    assert users['Bob']['email'] == 'bob@example.com'
+    assert github.transport.requests['api.github.com'] == 1
+
+
+def test_unknown_logins_resolve_to_none(github):
+    github.add_user('alice', email='alice@example.com')
+    handler = GitHubGraphQLHandler(['key'])
+
+    assert handler.fetch_users(['alice', 'ghost'])['ghost'] is None
+    assert lookup(handler, ['https://github.com/alice', 'https://github.com/ghost']) == ['alice@example.com', None]
+
+
+def test_failed_query_falls_back_to_rest(github, monkeypatch):
+    github.add_user('alice', email='alice@example.com')
+    github.add_user('bob', readme='Reach me at bob@example.com')
+    monkeypatch.setattr(github, '_graphql', lambda request: make_response(request, 502, {'message': 'Server Error'}))
+    handler = GitHubGraphQLHandler(['key'])
+
+    assert lookup(handler, ['https://github.com/alice', 'https://github.com/bob']) == ['alice@example.com', 'bob@example.com']
+    # One failed query, then one /users request per profile
+    assert github.transport.requests['api.github.com'] == 3
+
+
+def test_query_errors_other_than_not_found_fall_back_to_rest(github, monkeypatch):
+    github.add_user('alice', email='alice@example.com')
+    github.add_user('bob', readme='Reach me at bob@example.com')
+    body = {'data': None, 'errors': [{'type': 'RATE_LIMITED', 'message': 'API rate limit exceeded'}]}
+    monkeypatch.setattr(github, '_graphql', lambda request: make_response(request, 200, body))
+    handler = GitHubGraphQLHandler(['key'])
+
+    assert lookup(handler, ['https://github.com/alice', 'https://github.com/bob']) == ['alice@example.com', 'bob@example.com']
+    assert github.transport.requests['api.github.com'] == 3
+
+
+def test_bio_from_query_is_not_scraped_again(github, monkeypatch):
+    github.add_user('alice', bio='Building things, no email here')
+    handler = GitHubGraphQLHandler(['key'])
+    scraped = []
+    monkeypatch.setattr(handler, 'get_email_from_bio', lambda *args, **kwargs: scraped.append(args) or (None, True))
+
+    assert lookup(handler, ['https://github.com/alice']) == [None]
+    assert scraped == []
+    assert github.transport.requests['github.com'] == 0
+    assert github.transport.requests['raw.githubusercontent.com'] == 1
+
+
+def test_graphql_budget_is_tracked_apart_from_core(github):
+    github.add_user('alice', email='alice@example.com')
+    handler = GitHubGraphQLHandler(['key'])
+
+    handler.fetch_users(['alice'])
+
+    assert handler.remaining['graphql'][0] == github.rate_limit_per_key - 1
+    assert handler.remaining['core'][0] is None
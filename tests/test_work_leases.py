@@ -0,0 +1,33 @@
+from work_leases import LeaseTable, DONE, SUBMITTED
+
+
+def test_expired_lease_can_only_be_submitted_by_its_new_holder(tmp_path):
+    leases = LeaseTable(str(tmp_path / 'leases.sqlite'))
+    leases.add(2, 3, [[2, {'Username': 'a'}], [3, {'Username': 'b'}]])
+    leases.seal()
+
+    first = leases.acquire('worker-1', ttl=0)
+    second = leases.acquire('worker-2', ttl=60)
+
+    assert first[0] == second[0]
+    assert leases.submit(first[0], 'worker-1') is False
+    assert leases.submit(second[0], 'worker-2') is True
+    assert leases.state(second[0]) == (SUBMITTED, 'worker-2')
+    assert leases.submit(second[0], 'worker-2') is False
+
+
+def test_released_ranges_lose_their_submitter(tmp_path):
+    leases = LeaseTable(str(tmp_path / 'leases.sqlite'))
+    leases.add(2, 2, [[2, {'Username': 'a'}]])
+    leases.seal()
+    lease_id, _ = leases.acquire('worker-1', ttl=60)
+    leases.submit(lease_id, 'worker-1')
+
+    leases.release_unfinished()
+
+    assert leases.state(lease_id) != (SUBMITTED, 'worker-1')
+    lease_id, _ = leases.acquire('worker-2', ttl=60)
+    leases.submit(lease_id, 'worker-2')
+    leases.complete(lease_id)
+    assert leases.state(lease_id)[0] == DONE
+    assert leases.is_complete()
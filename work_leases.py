@@ -0,0 +1,116 @@
+import json
+import time
+import sqlite3
+import threading
+
+# Lease states of a row range
+PENDING = 'pending'       # waiting for a worker
+LEASED = 'leased'         # a worker is processing it; taken over by another worker once the lease expires
+SUBMITTED = 'submitted'   # results handed to the writer, not flushed yet
+DONE = 'done'             # results flushed
+
+# SQLite table of row ranges shared by several worker processes. Each range carries its rows as a JSON payload;
+# workers lease one range at a time, and the single writer marks a range done once its results are flushed.
+class LeaseTable:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS leases ("
+            " id INTEGER PRIMARY KEY, start_row INTEGER, end_row INTEGER, payload TEXT,"
+            " status TEXT, worker TEXT, expires REAL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS leases_status ON leases (status)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _execute(self, sql, params=()):
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    # Function to drop every range and the sealed flag, to start a new pass
+    def reset(self):
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.execute("DELETE FROM leases")
+            self.connection.execute("DELETE FROM meta")
+            self.connection.execute("COMMIT")
+
+    # Function to add a row range with its rows
+    def add(self, start_row, end_row, rows):
+        self._execute(
+            "INSERT INTO leases (start_row, end_row, payload, status) VALUES (?, ?, ?, ?)",
+            (start_row, end_row, json.dumps(rows), PENDING)
+        )
+
+    # Function to mark that every range has been added
+    def seal(self):
+        self._execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('sealed', '1')")
+
+    def is_sealed(self):
+        return bool(self._execute("SELECT 1 FROM meta WHERE key = 'sealed'"))
+
+    # Function to lease the first free range, or one whose lease expired; returns (lease id, rows) or None
+    def acquire(self, worker, ttl):
+        now = time.time()
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.connection.execute(
+                    "SELECT id, payload FROM leases WHERE status = ? OR (status = ? AND expires < ?) ORDER BY id LIMIT 1",
+                    (PENDING, LEASED, now)
+                ).fetchone()
+                if row is not None:
+                    self.connection.execute(
+                        "UPDATE leases SET status = ?, worker = ?, expires = ? WHERE id = ?",
+                        (LEASED, worker, now + ttl, row[0])
+                    )
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+        return (row[0], json.loads(row[1])) if row is not None else None
+
+    # Function to record that a range's results are being handed to the writer. Returns False when the worker no longer
+    # holds the lease (it expired and another worker took the range over); its results must then be dropped.
+    def submit(self, lease_id, worker):
+        with self.lock:
+            cursor = self.connection.execute(
+                "UPDATE leases SET status = ? WHERE id = ? AND worker = ? AND status = ?", (SUBMITTED, lease_id, worker, LEASED)
+            )
+            return cursor.rowcount == 1
+
+    # Function to get a range's (status, worker), or None for an unknown range
+    def state(self, lease_id):
+        rows = self._execute("SELECT status, worker FROM leases WHERE id = ?", (lease_id,))
+        return tuple(rows[0]) if rows else None
+
+    # Function to record that a range's results are in the sheet
+    def complete(self, lease_id):
+        self._execute("UPDATE leases SET status = ?, payload = NULL WHERE id = ?", (DONE, lease_id))
+
+    # Function to hand every range that is not done back to the pool, e.g. after the workers or the writer died
+    def release_unfinished(self):
+        self._execute("UPDATE leases SET status = ?, worker = NULL WHERE status IN (?, ?)", (PENDING, LEASED, SUBMITTED))
+
+    # Function to count ranges by state
+    def counts(self):
+        return dict(self._execute("SELECT status, COUNT(*) FROM leases GROUP BY status"))
+
+    # Function to check whether workers can stop: everything was added and no range is waiting to be leased
+    def is_drained(self):
+        if not self.is_sealed():
+            return False
+        waiting = self._execute(
+            "SELECT COUNT(*) FROM leases WHERE status = ? OR (status = ? AND expires < ?)", (PENDING, LEASED, time.time())
+        )[0][0]
+        return waiting == 0
+
+    # Function to check whether every range has been flushed
+    def is_complete(self):
+        return self.is_sealed() and self._execute("SELECT COUNT(*) FROM leases WHERE status != ?", (DONE,))[0][0] == 0
+
+    def close(self):
+        with self.lock:
+            self.connection.close()